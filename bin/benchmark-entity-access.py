@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""
+Benchmark Entity attribute access.
+
+Compares the per-class property table used by Entity.get/set against the
+previous lookup, which called getattr() on the class and checked for a
+property on every access.
+
+Usage (from the repository root):
+
+    python bin/benchmark-entity-access.py
+"""
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.core import Character  # noqa: E402
+
+import settings  # noqa: E402
+
+
+ITERATIONS = 200000
+
+
+class LegacyCharacter(Character):
+    """
+    Character using the previous Entity access path.
+
+    Every access, attribute or item, goes through get/set, which look the
+    name up on the class with getattr() first.  Nothing is inherited from
+    the current Entity access methods.
+    """
+
+    def __setattr__(self, name, value):
+        return self.set(name, value)
+
+    def __getattr__(self, name):
+        return self.get(name)
+
+    def __setitem__(self, name, value):
+        return self.set(name, value)
+
+    def __getitem__(self, name):
+        return self.get(name)
+
+    def _get_property(self, name):
+        prop_check = getattr(self.__class__, name, None)
+        if isinstance(prop_check, property):
+            return prop_check
+        return None
+
+    def get(self, name, default=None):
+        prop = self._get_property(name)
+        if prop:
+            return prop.fget(self, default)
+        return self._data.get(name, default)
+
+    def set(self, name, value):
+        prop = self._get_property(name)
+        if prop:
+            prop.fset(self, value)
+        else:
+            self._data[name] = value
+
+
+def load_record():
+    path = "{}/characters/Kk.json".format(settings.DATA_FOLDER)
+    with open(path, "r") as fh:
+        return json.loads(fh.read())
+
+
+def measure(entity, statement):
+    seconds = min(timeit.repeat(
+        statement, globals={"entity": entity}, number=ITERATIONS, repeat=5))
+    return seconds / ITERATIONS * 1e9
+
+
+def main():
+    record = load_record()
+    cases = (
+        ("read field", "entity.name"),
+        ("read missing field", "entity.tier"),
+        ("read item", "entity['experience']"),
+        ("write field", "entity.title = 'the Tester'"),
+    )
+
+    print("{:<20} {:>12} {:>12} {:>8}".format(
+        "case", "before ns", "after ns", "speedup"))
+
+    for label, statement in cases:
+        before = measure(LegacyCharacter(dict(record)), statement)
+        after = measure(Character(dict(record)), statement)
+        print("{:<20} {:>12.1f} {:>12.1f} {:>7.2f}x".format(
+            label, before, after, before / after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+#!/usr/bin/env python
+"""
+Benchmark the Pathfinder.
+
+Builds a grid of rooms with a few walls and one-way exits, and times
+Pathfinder routes between random pairs of rooms.  Every route found is
+walked to check it arrives, and its length is checked against a separate
+breadth first search over the graph, which is also timed as a reference.
+
+Usage (from the repository root):
+
+    python bin/benchmark-pathfinder.py [rooms]
+"""
+from collections import deque
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.core import Pathfinder, RoomGraph  # noqa: E402
+
+import settings  # noqa: E402
+
+
+ROOMS = 100000
+QUERIES = 30
+SEED = 4242
+
+# Chances that an exit is missing, or only leads one way.
+WALL_CHANCE = 0.15
+ONE_WAY_CHANCE = 0.05
+
+MOVES = {
+    "north": (-1, 0),
+    "east": (0, 1),
+    "south": (1, 0),
+    "west": (0, -1),
+}
+
+
+class GraphPathfinder(Pathfinder):
+    """Pathfinder searching a given graph, without a Game around it."""
+
+    def __init__(self, graph):
+        super(GraphPathfinder, self).__init__(None)
+        self._graph = graph
+
+    @property
+    def graph(self):
+        return self._graph
+
+
+def build_graph(rooms, rand):
+    """Return a RoomGraph of a square grid of at least rooms rooms."""
+    size = int(rooms ** 0.5)
+    if size * size < rooms:
+        size += 1
+
+    def vnum(y, x):
+        return "room_{}_{}".format(y, x)
+
+    exits = {}
+    for y in range(size):
+        for x in range(size):
+            exits[(y, x)] = {}
+
+    opposites = {
+        direction: settings.DIRECTIONS[direction]["opposite_id"]
+        for direction in MOVES}
+    for (y, x), room_exits in exits.items():
+        for direction in ("east", "south"):
+            dy, dx = MOVES[direction]
+            other = (y + dy, x + dx)
+            if other not in exits or rand.random() < WALL_CHANCE:
+                continue
+
+            room_exits[direction] = {"room_vnum": vnum(*other)}
+            if rand.random() >= ONE_WAY_CHANCE:
+                exits[other][opposites[direction]] = {"room_vnum": vnum(y, x)}
+
+    graph = RoomGraph(settings.DIRECTIONS)
+    for (y, x), room_exits in exits.items():
+        graph.update_room({
+            "id": vnum(y, x),
+            "vnum": vnum(y, x),
+            "exits": room_exits,
+        })
+    return graph
+
+
+def plain_distance(graph, start, goal):
+    """Return the length of a shortest route, searching with a deque."""
+    if start == goal:
+        return 0
+
+    exits = [graph.exits[direction] for direction in graph.directions]
+    distances = {start: 0}
+    queue = deque([start])
+    while queue:
+        room = queue.popleft()
+        distance = distances[room] + 1
+        for targets in exits:
+            target = targets[room]
+            if target < 0 or target in distances:
+                continue
+            if target == goal:
+                return distance
+            distances[target] = distance
+            queue.append(target)
+    return None
+
+
+def walk(graph, start, route):
+    room = start
+    for direction in route:
+        room = graph.exits[direction][room]
+        if room < 0:
+            return None
+    return room
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else ROOMS
+    rand = random.Random(SEED)
+
+    started = time.time()
+    graph = build_graph(rooms, rand)
+    print("Built {} rooms in {:.1f}s".format(
+        len(graph.vnums), time.time() - started))
+
+    pathfinder = GraphPathfinder(graph)
+    reference_times = []
+    search_times = []
+    unreachable = 0
+
+    for _ in range(QUERIES):
+        start = rand.randrange(len(graph.vnums))
+        goal = rand.randrange(len(graph.vnums))
+
+        started = time.perf_counter()
+        expected = plain_distance(graph, start, goal)
+        reference_times.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        route = pathfinder.search(start, goal)
+        search_times.append(time.perf_counter() - started)
+
+        if expected is None:
+            assert route is None, "found a route the plain search did not"
+            unreachable += 1
+            continue
+
+        assert route is not None, "missed a route the plain search found"
+        assert len(route) == expected, "route is {} long, not {}".format(
+            len(route), expected)
+        assert walk(graph, start, route) == goal, "route does not arrive"
+
+    print("{} queries, {} unreachable, every route checked".format(
+        QUERIES, unreachable))
+    print("{:<24} {:>12} {:>12}".format(
+        "case", "reference ms", "search ms"))
+
+    for label, summarize in (("mean", lambda times: sum(times) / len(times)),
+                             ("slowest", max)):
+        reference = summarize(reference_times) * 1e3
+        search = summarize(search_times) * 1e3
+        print("{:<24} {:>12.2f} {:>12.2f}".format(
+            "find_path, " + label, reference, search))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+"""
+Benchmark the storage serializers.
+
+Times encoding and decoding the records in data/characters and
+data/areas/haven.json with every STORAGE_FORMAT whose package is
+installed, and compares the size of what each one writes.
+
+Usage (from the repository root):
+
+    python bin/benchmark-serializers.py
+"""
+import glob
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mud.serializers import SERIALIZERS, UnavailableSerializer, \
+    get_serializer  # noqa: E402
+
+import settings  # noqa: E402
+
+
+REPEAT = 5
+
+
+def load_records(pattern):
+    records = []
+    for path in sorted(glob.glob(pattern)):
+        with open(path, "r") as fh:
+            records.append(json.loads(fh.read()))
+    return records
+
+
+def measure(func, number):
+    seconds = min(timeit.repeat(func, number=number, repeat=REPEAT))
+    return seconds / number * 1e6
+
+
+def benchmark(label, records, number):
+    print("{} ({} records)".format(label, len(records)))
+    print("{:<12} {:>12} {:>12} {:>10}".format(
+        "format", "dumps us", "loads us", "bytes"))
+
+    for name in sorted(SERIALIZERS):
+        try:
+            serializer = get_serializer(name)
+        except UnavailableSerializer:
+            print("{:<12} {:>12}".format(name, "not installed"))
+            continue
+
+        encoded = [serializer.dumps(record) for record in records]
+
+        def dumps():
+            for record in records:
+                serializer.dumps(record)
+
+        def loads():
+            for contents in encoded:
+                serializer.loads(contents)
+
+        size = sum(len(contents) for contents in encoded)
+        print("{:<12} {:>12.1f} {:>12.1f} {:>10}".format(
+            name, measure(dumps, number), measure(loads, number), size))
+
+    print("")
+
+
+def main():
+    benchmark(
+        "data/characters",
+        load_records("{}/characters/*.json".format(settings.DATA_FOLDER)),
+        2000)
+    benchmark(
+        "data/areas/haven.json",
+        load_records("{}/areas/haven.json".format(settings.DATA_FOLDER)),
+        500)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+"""
+Benchmark warm restarts from the binary snapshot.
+
+Copies the data folder into a temporary one and adds generated Areas full
+of rooms, actors and objects, and a folder of Character files.  The Game is
+started once from the data files alone and stopped, which writes the
+snapshot, then started again from the snapshot a few times, and the records
+each start loaded are compared.  Edits that only reached memory, and files
+changed while the game was down, are then checked to come from the data
+files on the next start and not from the snapshot.
+
+Usage (from the repository root):
+
+    python bin/benchmark-snapshot.py [records]
+"""
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings  # noqa: E402
+
+
+RECORDS = 100000
+AREAS = 20
+CHARACTERS = 1000
+SEED = 4242
+TARGET_SECONDS = 1.0
+# Warm starts timed, of which the fastest is reported, as the machine is
+# shared and single starts vary.
+WARM_STARTS = 3
+
+# How each Area's members are split between rooms, actors and objects.
+SHARES = (("rooms", 0.6), ("actors", 0.3), ("objects", 0.1))
+
+
+def write_world(folder, records, rand):
+    """Add generated Areas and Characters to a data folder."""
+    per_area = (records - CHARACTERS) // AREAS
+    for number in range(AREAS):
+        area_vnum = "generated{}".format(number)
+        area = {"id": area_vnum, "vnum": area_vnum,
+                "name": "Generated Area {}".format(number), "scripts": []}
+
+        for key, share in SHARES:
+            area[key] = []
+            for member in range(int(per_area * share)):
+                area[key].append({
+                    "id": "{}_{}_{}".format(area_vnum, key, member),
+                    "vnum": "{}_{}_{}".format(area_vnum, key, member),
+                    "name": "a generated {}".format(key[:-1]),
+                    "flags": [],
+                })
+
+        rooms = area["rooms"]
+        for index, room in enumerate(rooms):
+            room["description"] = ["An unremarkable place."]
+            room["exits"] = {}
+            if index + 1 < len(rooms):
+                room["exits"]["east"] = {"room_vnum": rooms[index + 1]["vnum"]}
+            if index > 0:
+                room["exits"]["west"] = {"room_vnum": rooms[index - 1]["vnum"]}
+
+        for key in ("actors", "objects"):
+            for member in area[key]:
+                member["room_id"] = rand.choice(rooms)["id"]
+
+        path = "{}/areas/{}.json".format(folder, area_vnum)
+        with open(path, "w") as fh:
+            fh.write(json.dumps(area, indent=4, sort_keys=True))
+
+    for number in range(CHARACTERS):
+        name = "Generated{}".format(number)
+        path = "{}/characters/{}.json".format(folder, name)
+        with open(path, "w") as fh:
+            fh.write(json.dumps({
+                "id": "character{}".format(number),
+                "name": name,
+                "room_id": "generated0_rooms_0",
+                "online": False,
+                "flags": [],
+            }))
+
+
+def start_game():
+    from mud.game import Game
+
+    started = time.perf_counter()
+    game = Game()
+    return game, time.perf_counter() - started
+
+
+def count_records(game):
+    return sum(len(records) for records in game.data.values())
+
+
+def main():
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else RECORDS
+    rand = random.Random(SEED)
+    folder = tempfile.mkdtemp(prefix="undermountain-snapshot-")
+    # After mud.game has set its own level, or every load is logged.
+    import mud.game  # noqa: F401
+    logging.getLogger().setLevel(logging.WARNING)
+
+    try:
+        data_folder = "{}/data".format(folder)
+        shutil.copytree(
+            settings.DATA_FOLDER, data_folder,
+            ignore=shutil.ignore_patterns("journals", "*.sqlite3*"))
+        settings.DATA_FOLDER = data_folder
+        settings.SQLITE_DATABASE = "{}/undermountain.sqlite3".format(folder)
+        settings.SNAPSHOT_FILE = "{}/snapshot.bin".format(folder)
+        settings.SNAPSHOT_INTERVAL = None
+        write_world(data_folder, records, rand)
+
+        # The Character files are imported into their journal on the first
+        # start, which is not what is being measured.
+        game, _ = start_game()
+        game.stop()
+        os.remove(settings.SNAPSHOT_FILE)
+
+        cold, cold_seconds = start_game()
+        started = time.perf_counter()
+        cold.stop()
+        stop_seconds = time.perf_counter() - started
+
+        warm_times = []
+        for _ in range(WARM_STARTS):
+            if warm_times:
+                warm.stop()
+            warm, seconds = start_game()
+            assert warm.data == cold.data, "the snapshot loaded other records"
+            warm_times.append(seconds)
+        warm_seconds = min(warm_times)
+
+        print("{} records, {} bytes of snapshot".format(
+            count_records(warm), os.path.getsize(settings.SNAPSHOT_FILE)))
+        print("{:<32} {:>10.3f}s".format("start from data files",
+                                         cold_seconds))
+        print("{:<32} {:>10.3f}s".format("stop, writing the snapshot",
+                                         stop_seconds))
+        print("{:<32} {:>10.3f}s".format("start from the snapshot",
+                                         warm_seconds))
+        print("{:<32} {}".format("  each of {} starts".format(WARM_STARTS),
+                                 " ".join("{:.3f}s".format(seconds)
+                                          for seconds in warm_times)))
+
+        # A Room saved without its Area never reached the disk, and a file
+        # changed while the game is down must be read again.
+        room = warm.get_injector("Rooms").get({"vnum": "generated0_rooms_0"})
+        room.name = "Unsaved"
+        room.save()
+        warm.stop()
+
+        path = "{}/areas/generated1.json".format(data_folder)
+        with open(path, "r") as fh:
+            area = json.loads(fh.read())
+        area["rooms"][0]["name"] = "Edited"
+        with open(path, "w") as fh:
+            fh.write(json.dumps(area, indent=4, sort_keys=True))
+
+        checked, _ = start_game()
+        Rooms = checked.get_injector("Rooms")
+        name = Rooms.get({"vnum": "generated0_rooms_0"}).name
+        assert name != "Unsaved", "the snapshot kept an unsaved edit"
+        name = Rooms.get({"vnum": "generated1_rooms_0"}).name
+        assert name == "Edited", "the snapshot hid a changed file"
+        print("Unsaved edits and changed files were not taken from it")
+
+        met = warm_seconds < TARGET_SECONDS
+        print("Warm start goal of {:.1f}s: {} ({:.3f}s)".format(
+            TARGET_SECONDS, "met" if met else "NOT met", warm_seconds))
+    finally:
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Benchmark the SQLite storage backend.
+
+Writes a folder of character files, as FileStorage does, and runs a
+Collection stored in SQLiteStorage over it in a temporary data folder:
+importing the files into an empty table, loading the table again, saving
+a batch of changed records in one transaction, and querying the indexed
+columns with SQL while the Collection is open.  Every step is checked
+against the records it should produce.
+
+Usage (from the repository root):
+
+    python bin/benchmark-sqlite-storage.py [records]
+"""
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import settings  # noqa: E402
+
+from mud.collection import Collection, SQLiteStorage  # noqa: E402
+
+
+RECORDS = 10000
+SAVES = 1000
+SEED = 4242
+
+
+class BenchmarkGame(object):
+    """Just enough of a Game to hold a Collection."""
+
+    def __init__(self):
+        self.data = {}
+
+    def handle_exception(self, exception):
+        raise exception
+
+
+class Characters(Collection):
+    STORAGE_CLASS = SQLiteStorage
+    STORAGE_FILENAME_FIELD = "name"
+    INDEXES = ("room_id", "online", "name")
+
+
+def write_files(folder, count, rand):
+    os.makedirs("{}/characters".format(folder))
+    records = {}
+    for number in range(count):
+        record = {
+            "id": "character{}".format(number),
+            "name": "Character{}".format(number),
+            "room_id": "room{}".format(rand.randrange(500)),
+            "online": False,
+            "experience": rand.randrange(100000),
+            "stats": {"hp": 100, "mana": 100},
+            "flags": [],
+        }
+        records[record["id"]] = record
+        path = "{}/characters/{}.json".format(folder, record["name"])
+        with open(path, "w") as fh:
+            fh.write(json.dumps(record))
+    return records
+
+
+def timed(label, func):
+    started = time.perf_counter()
+    result = func()
+    print("{:<32} {:>10.1f}ms".format(
+        label, (time.perf_counter() - started) * 1e3))
+    return result
+
+
+def open_collection():
+    return Characters(BenchmarkGame())
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else RECORDS
+    rand = random.Random(SEED)
+    folder = tempfile.mkdtemp(prefix="undermountain-sqlite-")
+
+    try:
+        settings.DATA_FOLDER = folder
+        settings.SQLITE_DATABASE = "{}/undermountain.sqlite3".format(folder)
+        expected = write_files(folder, count, rand)
+        print("{} character files in {}".format(count, folder))
+
+        characters = timed("import files", open_collection)
+        assert characters.data == expected, "imported records differ"
+
+        timed("load table", open_collection)
+
+        changed = rand.sample(sorted(expected), min(SAVES, count))
+
+        def save():
+            for record_id in changed:
+                character = characters.get(record_id)
+                character.online = True
+                character.experience += 1
+                characters.save(character)
+                expected[record_id] = dict(character.get_data())
+            characters.flush()
+
+        timed("save {} records".format(len(changed)), save)
+
+        connection = SQLiteStorage.get_connection()
+        online = timed("query online, SQL", lambda: connection.execute(
+            'SELECT COUNT(*) FROM "characters" WHERE "field_online" = 1'
+        ).fetchone()[0])
+        assert online == len(changed), "{} online, not {}".format(
+            online, len(changed))
+
+        plan = connection.execute(
+            'EXPLAIN QUERY PLAN SELECT data FROM "characters" '
+            'WHERE "field_room_id" = ?', ("room1",)).fetchall()
+        assert any("characters_field_room_id" in row[-1] for row in plan), \
+            "room_id query does not use its index: {}".format(plan)
+
+        in_room = timed("query room_id, SQL", lambda: connection.execute(
+            'SELECT data FROM "characters" WHERE "field_room_id" = ?',
+            ("room1",)).fetchall())
+        assert len(in_room) == sum(
+            1 for record in expected.values()
+            if record["room_id"] == "room1"), "wrong rooms"
+
+        reloaded = timed("load table after saves", open_collection)
+        assert reloaded.data == expected, "saved records differ"
+
+        print("Every step matched the records written")
+    finally:
+        for connection in SQLiteStorage.CONNECTIONS.values():
+            connection.close()
+        SQLiteStorage.CONNECTIONS.clear()
+        shutil.rmtree(folder)
+
+
+if __name__ == "__main__":
+    main()
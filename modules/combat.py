@@ -92,9 +92,11 @@ class Battle(object):
             actor.echo(
                 "{{BYour {}{{B {}{{B {}{{B! {{B-{{R={{C{}{{R={{B-{{x".format(
                     noun, amount_text, target.name, amount))
+            # Other people's fights are spam, lagging players can do without.
             actor.act(
                 "{{c{}'s {}{{c {}{{c {}{{c! {{B-{{R={{C{}{{R={{B-{{x".format(
-                    actor.name, noun, amount_text, target.name, amount, exclude=target))
+                    actor.name, noun, amount_text, target.name, amount, exclude=target),
+                low_priority=True)
             target.echo(
                 "{{B{}'s {}{{B {}{{B you! {{B-{{R={{C{}{{R={{B-{{x".format(
                     actor.name, noun, amount_text, amount))
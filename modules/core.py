@@ -1,26 +1,201 @@
 from datetime import datetime
+from mud.broadcast import Broadcast
 from mud.module import Module
-from mud.collection import Collection, Entity, FileStorage
+from mud.collection import Collection, Entity, FileStorage, JournalStorage, \
+    MemoryStorage, SQLiteStorage
 from mud.inject import inject
+from mud.injector import Injector
 from utils.ansi import pad_right, stop_color_bleed
 from utils.hash import get_random_hash
 from mud.timer_manager import TimerManager
 from random import randint, choice
+from array import array
+from collections import OrderedDict
 
 import gevent
-import settings
+import json
 import logging
+import os
+import settings
+import time
 
 
 EXIT_DOOR = "door"
 EXIT_CLOSED = "closed"
 EXIT_SECRET = "secret"
 
+class RoomGraph(object):
+    """
+    The exits between Rooms, as arrays indexed by an integer per Room vnum.
+
+    Rooms keeps it up to date as Rooms are stored, saved and deleted, and
+    it still holds the Rooms of unloaded Areas, so walking the world does
+    not need to look up any Room records.
+    """
+    NO_ROOM = -1
+
+    def __init__(self, directions):
+        self.directions = list(directions)
+        self.index = {}
+        self.vnums = []
+        self.known = bytearray()
+        self.exits = {
+            direction: array("l") for direction in self.directions}
+        # The directions of each room's exits, in the order of its record.
+        self.exit_directions = []
+        self.room_vnums = {}
+        self.version = 0
+
+    def get_index(self, vnum):
+        """Return the integer for a Room vnum, adding it if it is new."""
+        index = self.index.get(vnum, None)
+        if index is None:
+            index = self.index[vnum] = len(self.vnums)
+            self.vnums.append(vnum)
+            self.known.append(0)
+            self.exit_directions.append(())
+            for targets in self.exits.values():
+                targets.append(self.NO_ROOM)
+        return index
+
+    def add_vnums(self, vnums):
+        """Give integers to the new Room vnums, growing the arrays once."""
+        index = self.index
+        new = []
+        for vnum in vnums:
+            if vnum is not None and vnum not in index:
+                index[vnum] = len(self.vnums) + len(new)
+                new.append(vnum)
+
+        count = len(new)
+        self.vnums.extend(new)
+        self.known.extend(bytes(count))
+        self.exit_directions.extend([()] * count)
+        for targets in self.exits.values():
+            targets.extend(array("l", [self.NO_ROOM]) * count)
+
+    def set_target(self, index, direction, target):
+        """Point an exit at a target, returning if it changed."""
+        targets = self.exits[direction]
+        previous = targets[index]
+        if previous == target:
+            return False
+
+        targets[index] = target
+        return True
+
+    def update_room(self, record):
+        """Bring a Room's vnum and exits up to date with its record."""
+        vnum = record.get("vnum", None)
+        if vnum is None:
+            return
+
+        previous = self.room_vnums.get(record["id"], None)
+        if previous is not None and previous != vnum:
+            self.clear_room(previous)
+        self.room_vnums[record["id"]] = vnum
+
+        index = self.get_index(vnum)
+        changed = not self.known[index]
+        self.known[index] = 1
+
+        exits = record.get("exits", None) or {}
+        directions = tuple(
+            direction for direction in exits if direction in self.exits)
+        if directions != self.exit_directions[index]:
+            self.exit_directions[index] = directions
+            changed = True
+
+        for direction in self.directions:
+            entry = exits.get(direction, None)
+            if entry is None:
+                target = self.NO_ROOM
+            else:
+                target = self.get_index(entry["room_vnum"])
+
+            if self.set_target(index, direction, target):
+                changed = True
+
+        # Only bump the version when the shape of the world changed.
+        if changed:
+            self.version += 1
+
+    def update_rooms(self, records):
+        """Bring many Rooms up to date at once, such as when they load."""
+        self.add_vnums(record.get("vnum", None) for record in records)
+
+        index_of = self.index
+        known = self.known
+        exits = self.exits
+        exit_directions = self.exit_directions
+        room_vnums = self.room_vnums
+        added = False
+
+        for record in records:
+            vnum = record.get("vnum", None)
+            if vnum is None:
+                continue
+
+            index = index_of[vnum]
+            if known[index] or record["id"] in room_vnums:
+                self.update_room(record)
+                continue
+
+            # A Room not known yet has no exits, only its own need setting.
+            room_vnums[record["id"]] = vnum
+            known[index] = 1
+
+            room_exits = record.get("exits", None) or {}
+            if exits.keys() >= room_exits.keys():
+                directions = tuple(room_exits)
+            else:
+                directions = tuple([
+                    direction for direction in room_exits
+                    if direction in exits])
+            exit_directions[index] = directions
+
+            for direction in directions:
+                entry = room_exits[direction]
+                if entry is not None:
+                    target = index_of.get(entry["room_vnum"], None)
+                    if target is None:
+                        target = self.get_index(entry["room_vnum"])
+                    exits[direction][index] = target
+            added = True
+
+        if added:
+            self.version += 1
+
+    def remove_room(self, record):
+        vnum = self.room_vnums.pop(record["id"], None)
+        if vnum is not None:
+            self.clear_room(vnum)
+            self.version += 1
+
+    def clear_room(self, vnum):
+        index = self.index.get(vnum, None)
+        if index is None:
+            return
+
+        self.known[index] = 0
+        self.exit_directions[index] = ()
+        for direction in self.directions:
+            self.set_target(index, direction, self.NO_ROOM)
+
+    def get_exit(self, index, direction):
+        """Return the integer of the known Room an exit leads to, or -1."""
+        target = self.exits[direction][index]
+        if target == self.NO_ROOM or not self.known[target]:
+            return self.NO_ROOM
+        return target
+
+
 class Map(object):
     @classmethod
     def from_actor(cls, actor, width=45, height=23, border=False):
         # Note: All coordinates are (row, col) to make things easier later.
         Rooms = actor.game.get_injector("Rooms")
+        graph = Rooms.graph
 
         VERTICAL_SYMBOL = "|"
         HORIZONTAL_SYMBOL = "--"
@@ -44,8 +219,8 @@ class Map(object):
             [EMPTY_SYMBOL for _ in range(width)] for _ in range(height)
         ]
 
-        start_room = actor.room
-        used_room_vnums = set([start_room.vnum])
+        start_room = graph.index[actor.room.vnum]
+        used_rooms = set([start_room])
         stack = [
             (height // 2, width // 2, start_room)
         ]
@@ -65,10 +240,14 @@ class Map(object):
                 grid[base_y][base_x] = (ORIGIN_COLOR + "@") \
                     if room == start_room else (ROOM_COLOR + "#")
 
-            for direction_id, entry in room.exits.items():
+            for direction_id in graph.exit_directions[room]:
                 if direction_id not in VALID_DIRECTIONS:
                     continue
 
+                next_room = graph.get_exit(room, direction_id)
+                if next_room == graph.NO_ROOM:
+                    continue
+
                 symbols, symbol_y_start, symbol_x_start, y_mod, x_mod = \
                     DIRECTIONS[direction_id]
 
@@ -92,10 +271,8 @@ class Map(object):
                 if not coords_are_valid(next_y, next_x):
                     continue
 
-                next_room = Rooms.get({"vnum": entry["room_vnum"]})
-
-                if next_room.vnum not in used_room_vnums:
-                    used_room_vnums.add(next_room.vnum)
+                if next_room not in used_rooms:
+                    used_rooms.add(next_room)
                     stack.append((next_y, next_x, next_room))
 
         if border:
@@ -120,6 +297,26 @@ class Map(object):
 
         return Map(grid)
 
+    @classmethod
+    def lines_from_actor(cls, actor, width=45, height=23, border=False):
+        """Return the lines of from_actor, cached until the exits change."""
+        Rooms = actor.game.get_injector("Rooms")
+        cache = Rooms.map_cache
+
+        key = (actor.room.id, width, height, border, Rooms.graph.version)
+        lines = cache.get(key, None)
+        if lines is not None:
+            cache.move_to_end(key)
+            return lines
+
+        lines = tuple(cls.from_actor(
+            actor, width=width, height=height, border=border).to_lines())
+        cache[key] = lines
+        if len(cache) > settings.MAP_CACHE_SIZE:
+            cache.popitem(last=False)
+
+        return lines
+
     def __init__(self, grid):
         self.grid = grid
 
@@ -187,7 +384,7 @@ def sockets_command(self, **kwargs):
     connections = self.game.connections.values()
 
     count = 0
-    self.echo("[Num Connected_State Login@ Idl] Name        Host")
+    self.echo("[Num Connected_State Login@ Idl  Queue] Name        Host")
     self.echo("-" * 79)
 
     for conn in connections:
@@ -196,11 +393,16 @@ def sockets_command(self, **kwargs):
         client = conn.client
         actor = conn.actor
 
-        self.echo("[{} {}  {} {}] {} {}:{}".format(
+        # Output waiting to be sent, flagged while low priority output drops.
+        queue = "{}K{}".format(
+            conn.write_queue_size // 1024, "!" if conn.throttled else " ")
+
+        self.echo("[{} {}  {} {} {}] {} {}:{}".format(
             str(conn.id).rjust(3),
             client.state.center(15),
             conn.created_date.strftime("%H:%M"),
             "   ",
+            queue.rjust(6),
             (actor.name if actor else "(None)").ljust(11),
             conn.hostname,
             conn.port,
@@ -210,8 +412,10 @@ def sockets_command(self, **kwargs):
     self.echo("{} users".format(count))
 
 
-def save_command(self):
+def save_command(self, **kwargs):
     self.save()
+    # Saves are written behind, only say so once it is on disk.
+    self.collection.flush(self)
     self.echo("Your character has been saved.")
 
 
@@ -364,13 +568,42 @@ def tell_command(self, args, Characters, **kwargs):
         char.echo("{{g{} tells you '{{G{}{{g'{{x".format(self.name, message))
 
 
+@inject("Rooms", "Pathfinder")
+def path_command(self, args, Rooms, Pathfinder, **kwargs):
+    """Display the shortest route to a Room."""
+    if not args:
+        self.echo("Find a path to which room?")
+        return
+
+    room = Rooms.fuzzy_get(args.pop(0))
+    if not room:
+        self.echo("That room does not exist.")
+        return
+
+    path = Pathfinder.find_path(self.room, room)
+    if path is None:
+        self.echo("There is no path from here to {}.".format(room.vnum))
+    elif not path:
+        self.echo("You are already there.")
+    else:
+        self.echo("Path to {}: {}".format(room.vnum, " ".join(path)))
+
+
 def map_command(self, **kwargs):
     """Display a Map to the Character."""
-    map = Map.from_actor(self)
+    width, height = self.terminal_size
+
+    if width and height:
+        # Fill the window, leaving room for the title and the prompt.
+        map_lines = Map.lines_from_actor(
+            self, width=max(width - 1, 9), height=max(height - 3, 5))
+    else:
+        width = 80
+        map_lines = Map.lines_from_actor(self)
 
     self.echo("{}'s Map of {}".format(
-        self.name, self.room.area.name).center(79))
-    self.echo("\n".join(map.to_lines()))
+        self.name, self.room.area.name).center(width - 1))
+    self.echo("\n".join(map_lines))
 
 
 def time_command(self, **kwargs):
@@ -416,7 +649,7 @@ def rooms_command(self, args, Rooms, Areas, **kwargs):
     self.echo("Rooms in {}".format(area.vnum))
 
     count = 0
-    for room in Rooms.query({"area_id": area.id}):
+    for room in area.rooms:
         count += 1
         self.echo("* {} - {} - {}{{x".format(room.id, room.vnum, room.name))
 
@@ -424,6 +657,26 @@ def rooms_command(self, args, Rooms, Areas, **kwargs):
         self.echo("No rooms found.")
 
 
+def queries_command(self, **kwargs):
+    """List the query specs which could not be answered by an index."""
+    self.echo("Full scans by Collection:")
+
+    count = 0
+    for name, collection in sorted(self.game.injectors.items()):
+        full_scans = getattr(collection, "full_scans", None)
+        if not full_scans:
+            continue
+
+        for keys, total in full_scans.most_common():
+            count += 1
+            plan = collection.explain({key: None for key in keys})
+            self.echo("* {} {} - {} scans of {} records".format(
+                name, list(keys), total, plan["records"]))
+
+    if count == 0:
+        self.echo("No full scans recorded.")
+
+
 @inject("Areas")
 def areas_command(self, Areas, **kwargs):
     """List all Areas available in the Game."""
@@ -474,7 +727,8 @@ def channel_command(self, name, message, **kwargs):
     template_to_others = channel["to_others"]
 
     self.echo(replace(channel.get("to_self", template_to_others)))
-    self.game.echo(replace(template_to_others), exclude=[self])
+    self.game.echo(
+        replace(template_to_others), exclude=[self], low_priority=True)
 
 
 @inject("Directions", "Rooms")
@@ -498,13 +752,14 @@ def unlink_command(self, args, Directions, Rooms, **kwargs):
 
     other_room = Rooms.get({"vnum": room.exits[direction.id]["room_vnum"]})
 
-    counter_exit = other_room.exits.get(direction.opposite_id, None)
+    counter_exit = other_room.exits.get(direction.opposite_id, None) \
+        if other_room else None
     if counter_exit and counter_exit["room_vnum"] == room.vnum:
-        del other_room.exits[direction.opposite_id]
+        other_room.remove_exit(direction.opposite_id)
         other_room.save()
         other_room.area.save()
 
-    del room.exits[direction.id]
+    room.remove_exit(direction.id)
     room.save()
     room.area.save()
 
@@ -539,16 +794,20 @@ def link_command(self, args, Directions, Rooms, **kwargs):
 
     other_room = Rooms.get({"vnum": room_vnum})
 
+    if not other_room:
+        self.echo("The Room VNUM you've requested does not exist.")
+        return
+
     if other_room.exits.get(direction.opposite_id, None):
         self.echo(
             "The other room already has an exit in the opposite direction.")
         return
 
-    room.exits[direction.id] = {"room_vnum": other_room.vnum}
+    room.set_exit(direction.id, other_room.vnum)
     room.save()
     room.area.save()
 
-    other_room.exits[direction.opposite_id] = {"room_vnum": room.vnum}
+    other_room.set_exit(direction.opposite_id, room.vnum)
     other_room.save()
     other_room.area.save()
 
@@ -599,9 +858,9 @@ def dig_command(self, args, Areas, Rooms, Directions, **kwargs):
         })
 
     # Link the Rooms
-    new_room.exits[direction.opposite_id] = {"room_vnum": room.vnum}
+    new_room.set_exit(direction.opposite_id, room.vnum)
     new_room.save()
-    room.exits[direction.id] = {"room_vnum": new_room.vnum}
+    room.set_exit(direction.id, new_room.vnum)
     room.save()
 
     # Save the area.
@@ -679,10 +938,9 @@ def look_command(self, args, Actors, Characters, Objects, Directions, **k):
     MINIMAP_JOIN_SYMBOLS = "  "
 
     if MINIMAP_ENABLED:
-        minimap = Map.from_actor(
+        map_lines = Map.lines_from_actor(
             self, width=MINIMAP_WIDTH, height=MINIMAP_HEIGHT,
             border=MINIMAP_BORDER)
-        map_lines = minimap.to_lines()
 
         map_line_count = len(map_lines)
         line_count = len(lines)
@@ -1370,6 +1628,13 @@ class Actor(Entity):
             return None
         return self.connection.client
 
+    @property
+    def terminal_size(self):
+        """The window width and height of the client, None where unknown."""
+        if not self.connection:
+            return None, None
+        return self.connection.terminal_size
+
     def say(self, message):
         say_command(self, message=message)
 
@@ -1384,27 +1649,34 @@ class Actor(Entity):
 
         if not skip_save:
             self.save()
+            self.collection.flush(self)
 
     def force(self, message):
         if not self.client:
             return
         self.client.handle_input(message)
 
-    def echo(self, message=""):
+    def echo(self, message="", low_priority=False):
         if not self.client:
             return
 
         if isinstance(message, list):
             for line in message:
-                self.echo(line)
+                self.echo(line, low_priority=low_priority)
+        elif low_priority or isinstance(message, Broadcast):
+            if not isinstance(message, Broadcast):
+                message = Broadcast(message, low_priority=True)
+
+            self.client.write_broadcast(message)
         else:
             self.client.writeln(str(message))
 
-    def act_to(self, target, template: str, **data):
+    def act_to(self, target, template: str, low_priority=False, **data):
         """Perform an acting emote towards a target.
 
         :param target: Actor
         :param template: a template string containing act tokens
+        :param low_priority: whether a lagging target may miss the message
         :param **data: a dictionary of extra act data
 
         See: self.act
@@ -1442,14 +1714,15 @@ class Actor(Entity):
             else:
                 raise Exception("Invalid data '{}'.".format(key))
 
-        target.echo(message)
+        target.echo(message, low_priority=low_priority)
 
-    def act(self, template: str, **data):
+    def act(self, template: str, low_priority=False, **data):
         """Perform an acting emote towards an entire room.
 
         :param target: Actor
         :param template: a template string containing act tokens
         :param exclude: a list of people to exclude from the to-room act
+        :param low_priority: whether lagging actors may miss the message
         :param **data: a dictionary of extra act data
         """
         Actors, Characters = self.game.get_injectors("Actors", "Characters")
@@ -1472,7 +1745,8 @@ class Actor(Entity):
 
                 # TODO: Visibility?
 
-                self.act_to(actor, template, **data)
+                self.act_to(
+                    actor, template, low_priority=low_priority, **data)
 
     def name_to(self, target):
         """Format an Actor's name towards a target.
@@ -1495,6 +1769,299 @@ class Actor(Entity):
         return [self.room]
 
 
+class AreaMemberStorage(MemoryStorage):
+    """Tell the Areas storage when a record kept in an Area file changes."""
+
+    def __init__(self, *args, **kwargs):
+        super(AreaMemberStorage, self).__init__(*args, **kwargs)
+        self.key = self.collection.__class__.__name__.lower()
+
+        # The Area vnums of records in unloaded Areas, by id and by vnum.
+        self.unloaded_ids = {}
+        self.unloaded_vnums = {}
+
+    @property
+    def areas(self):
+        return self.collection.game.get_injector("Areas")
+
+    @property
+    def area_storage(self):
+        return self.areas.storage
+
+    def unloaded(self, area_vnum, records):
+        for record in records:
+            self.unloaded_ids[record["id"]] = area_vnum
+            if "vnum" in record:
+                self.unloaded_vnums[record["vnum"]] = area_vnum
+
+    def loaded(self, records):
+        for record in records:
+            self.unloaded_ids.pop(record["id"], None)
+            self.unloaded_vnums.pop(record.get("vnum", None), None)
+
+    def load_missing(self, spec):
+        """Load the unloaded Area which holds the record spec looks for."""
+        if isinstance(spec, str):
+            area_vnum = self.unloaded_ids.get(spec, None)
+        elif "area_vnum" in spec:
+            area_vnum = spec["area_vnum"]
+        elif "vnum" in spec:
+            area_vnum = self.unloaded_vnums.get(spec["vnum"], None)
+        else:
+            return False
+
+        return self.areas.load_members(area_vnum)
+
+    def load_matching(self, vnum_prefix):
+        """Load every unloaded Area holding a record whose vnum matches."""
+        area_vnums = set(
+            area_vnum for vnum, area_vnum in self.unloaded_vnums.items()
+            if vnum.startswith(vnum_prefix))
+
+        for area_vnum in area_vnums:
+            self.areas.load_members(area_vnum)
+
+    def post_save(self, record):
+        area_vnum = record.get("area_vnum", None)
+        if area_vnum:
+            self.area_storage.member_changed(area_vnum, self.key, record)
+
+    def post_delete(self, record):
+        area_vnum = record.get("area_vnum", None)
+        if area_vnum:
+            self.area_storage.member_changed(area_vnum, self.key, record,
+                                             deleted=True)
+
+
+class AreaStorage(FileStorage):
+    """
+    Store each Area file with a journal of the edits made since.
+
+    Saving an Area appends only the rooms, actors, objects and scripts that
+    were saved or deleted since its last write to "<area file>.journal".
+    The journal is replayed when the Area is loaded, and folded back into
+    the Area file once it holds settings.AREA_JOURNAL_LIMIT entries.
+
+    Each rewrite of an Area file raises its generation, which the file and
+    the journals begun after it record.  A journal older than its file was
+    already folded into it and is never replayed, even if a crash left it
+    behind.
+    """
+    GENERATION_FIELD = "journal_generation"
+
+    def __init__(self, *args, **kwargs):
+        self.changes = {}
+        self.journal_sizes = {}
+        self.area_fields = {}
+        self.generations = {}
+        # Paths whose last rewrite failed, so the file lacks some edits.
+        self.failed = set()
+        super(AreaStorage, self).__init__(*args, **kwargs)
+
+    def get_journal_path(self, path):
+        return path + ".journal"
+
+    def get_area_fields(self, record):
+        """Serialize the Area's own fields, without its members."""
+        fields = {key: value for key, value in record.items()
+                  if key not in self.collection.MEMBER_KEYS}
+        return json.dumps(fields, sort_keys=True)
+
+    def member_changed(self, area_vnum, key, record, deleted=False):
+        changes = self.changes.setdefault(area_vnum, {})
+        changes[(key, record["id"])] = None if deleted else record
+
+    def has_unsaved(self, record):
+        """Return if some of an Area's edits are not on disk."""
+        return record["vnum"] in self.changes or \
+            self.get_record_path(record) in self.failed
+
+    def read_journal(self, path, generation):
+        """Return the journal's entries, or None if it is older than path."""
+        entries = []
+        journal_generation = 0
+        journal_path = self.get_journal_path(path)
+        if os.path.exists(journal_path):
+            with open(journal_path, "r") as fh:
+                for line in fh:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # A torn final line from an interrupted append.
+                        logging.error("Skipping journal line in {}".format(
+                            journal_path))
+                        continue
+
+                    if "generation" in entry:
+                        journal_generation = entry["generation"]
+                    else:
+                        entries.append(entry)
+
+        if entries and journal_generation != generation:
+            return None
+
+        return entries
+
+    def read_record(self, path, record):
+        record = super(AreaStorage, self).read_record(path, record)
+
+        generation = record.pop(self.GENERATION_FIELD, 0)
+        entries = self.read_journal(path, generation)
+        self.generations[path] = generation
+
+        if entries is None:
+            # Left by a crash while the file was rewritten, which has its
+            # edits already.  The next save rewrites the file without it.
+            self.journal_sizes[path] = None
+            entries = []
+        else:
+            self.journal_sizes[path] = len(entries)
+
+        self.apply_journal(record, entries)
+        self.area_fields[path] = self.get_area_fields(record)
+
+        # The file alone no longer matches the Area, never skip a rewrite.
+        if entries:
+            self.written.pop(path, None)
+
+        return record
+
+    def read_members(self, record):
+        """Read an unloaded Area's members back from its file and journal."""
+        # Let any write still running for the Area finish first.
+        self.flush(record)
+
+        path = self.get_record_path(record)
+        with open(path, self.get_file_mode("r")) as fh:
+            stored = self.parse_contents(fh.read())
+
+        generation = stored.pop(self.GENERATION_FIELD, 0)
+        self.apply_journal(stored, self.read_journal(path, generation) or [])
+        return stored
+
+    def apply_journal(self, record, entries):
+        members = {}
+        for key in self.collection.MEMBER_KEYS:
+            members[key] = {
+                entity["id"]: entity for entity in record.get(key, [])}
+
+        for entry in entries:
+            if "area" in entry:
+                record.update(entry["area"])
+            elif entry.get("deleted", False):
+                members[entry["type"]].pop(entry["id"], None)
+            else:
+                members[entry["type"]][entry["id"]] = entry["record"]
+
+        for key, entities in members.items():
+            record[key] = list(entities.values())
+
+    def dehydrate_record(self, path, record):
+        stored = super(AreaStorage, self).dehydrate_record(path, record)
+        generation = self.generations.get(path, 0)
+        if generation:
+            stored[self.GENERATION_FIELD] = generation
+        return stored
+
+    def write_record(self, path, record):
+        # The changes are only dropped once written or queued, an error
+        # leaves them for the next save, and Areas.dehydrate can see them.
+        changes = self.changes.get(record["vnum"], {})
+        written = self.write_changes(path, record, changes)
+        self.changes.pop(record["vnum"], None)
+        return written
+
+    def write_changes(self, path, record, changes):
+        size = self.journal_sizes.get(path, None)
+
+        if size is None or size + len(changes) >= \
+                settings.AREA_JOURNAL_LIMIT:
+            # Leave any journal behind, even one still being appended to.
+            self.generations[path] = self.generations.get(path, 0) + 1
+            self.journal_sizes[path] = 0
+            self.area_fields[path] = self.get_area_fields(record)
+            return super(AreaStorage, self).write_record(path, record)
+
+        lines = []
+
+        area_fields = self.get_area_fields(record)
+        if area_fields != self.area_fields.get(path, None):
+            lines.append('{{"area": {}}}'.format(area_fields))
+
+        for (key, member_id), member in changes.items():
+            entry = {"type": key, "id": member_id}
+            if member is None:
+                entry["deleted"] = True
+            else:
+                entry["record"] = self.collection.dehydrate_member(member)
+            lines.append(json.dumps(entry, sort_keys=True))
+
+        if not lines:
+            return False
+
+        # Sizes and fields are only counted once the lines are on disk, and
+        # the changes are kept to be journaled again if they never get there.
+        self.written.pop(path, None)
+        self.queue_operation(path, self.append_journal, {
+            "vnum": record["vnum"],
+            "generation": self.generations.get(path, 0),
+            "contents": "\n".join(lines) + "\n",
+            "lines": len(lines),
+            "area_fields": area_fields,
+            "changes": changes,
+        }, replaces=False)
+
+        return True
+
+    def post_delete(self, record):
+        super(AreaStorage, self).post_delete(record)
+        path = self.get_record_path(record)
+        self.changes.pop(record["vnum"], None)
+        self.journal_sizes.pop(path, None)
+        self.area_fields.pop(path, None)
+        self.generations.pop(path, None)
+        self.failed.discard(path)
+
+    def operation_succeeded(self, path, func, contents):
+        if func == self.write_file:
+            self.failed.discard(path)
+
+        if func != self.append_journal or \
+                self.journal_sizes.get(path, None) is None:
+            return
+
+        self.journal_sizes[path] += contents["lines"]
+        self.area_fields[path] = contents["area_fields"]
+
+    def operation_failed(self, path, func, contents, error):
+        super(AreaStorage, self).operation_failed(path, func, contents, error)
+
+        if func == self.append_journal:
+            # Changes made since are newer than the ones that failed.
+            changes = self.changes.setdefault(contents["vnum"], {})
+            for key, member in contents["changes"].items():
+                changes.setdefault(key, member)
+        elif func == self.write_file:
+            # The journal may be stale now, rewrite the whole file next.
+            self.journal_sizes.pop(path, None)
+            self.failed.add(path)
+
+    def append_journal(self, path, contents):
+        with open(self.get_journal_path(path), "a") as fh:
+            if fh.tell() == 0:
+                fh.write(json.dumps(
+                    {"generation": contents["generation"]}) + "\n")
+            fh.write(contents["contents"])
+
+    def write_file(self, path, contents):
+        super(AreaStorage, self).write_file(path, contents)
+        self.remove_file(self.get_journal_path(path))
+
+    def remove_file(self, path, contents=None):
+        super(AreaStorage, self).remove_file(path, contents)
+        super(AreaStorage, self).remove_file(self.get_journal_path(path))
+
+
 class Account(Entity):
     pass
 
@@ -1520,55 +2087,191 @@ class Area(Entity):
     @property
     @inject("Rooms")
     def rooms(self, Rooms):
+        self.collection.load_members(self.vnum)
         return Rooms.query({"area_id": self.id})
 
     @property
-    def children(self):
-        return self.rooms
+    @inject("Rooms")
+    def children(self, Rooms):
+        # Events do not load an unloaded Area, there is nobody to see them.
+        return Rooms.query({"area_id": self.id})
 
 
 class Areas(Collection):
     ENTITY_CLASS = Area
-    STORAGE_CLASS = FileStorage
-
-    @inject("Rooms", "Actors", "Objects", "Scripts")
-    def hydrate(self, record, Rooms, Objects, Actors, Scripts):
+    STORAGE_CLASS = AreaStorage
+    # Area files are edited and reviewed by builders, keep them readable.
+    STORAGE_FORMAT = "pretty-json"
+    INDEXES = ("vnum",)
+    MEMBER_KEYS = ("rooms", "actors", "objects", "scripts")
+
+    def __init__(self, *args, **kwargs):
+        # The vnums of Areas whose members are not in memory, and when each
+        # loaded Area last had a player in it.
+        self.unloaded = set()
+        self.visited = {}
+        super(Areas, self).__init__(*args, **kwargs)
+
+    def get_member_collections(self):
+        return [
+            (key, self.game.get_injector(key.capitalize()))
+            for key in self.MEMBER_KEYS]
+
+    def hydrate(self, record):
         """Load the Area from the file."""
 
         # Ensure all records have the Area's information in them
-        keys = ["rooms", "actors", "objects", "scripts"]
-        for key in keys:
+        for key in self.MEMBER_KEYS:
             for entity in record[key]:
                 entity["area_vnum"] = record["vnum"]
                 entity["area_id"] = record["id"]
 
-        # Save all attached records
-        [Rooms.save(room) for room in record.pop("rooms")]
-        [Objects.save(obj) for obj in record.pop("objects")]
-        [Actors.save(actor) for actor in record.pop("actors")]
-        [Scripts.save(script) for script in record.pop("scripts")]
+        # The members are found again from the file once something needs them
+        if settings.AREA_LAZY_LOADING:
+            # The world can still be walked through the Area without them.
+            self.game.get_injector("Rooms").graph.update_rooms(
+                record["rooms"])
+
+            self.unloaded.add(record["vnum"])
+            for key, collection in self.get_member_collections():
+                collection.storage.unloaded(record["vnum"], record.pop(key))
+            return record
+
+        # Store all attached records, they are already in the Area's file
+        for key, collection in self.get_member_collections():
+            collection.insert(record.pop(key))
 
         return record
 
-    @inject("Rooms", "Actors", "Objects", "Scripts")
-    def dehydrate(self, record, Rooms, Actors, Objects, Scripts):
+    def load_members(self, area_vnum):
+        """Load the members of an unloaded Area, returning if it was one."""
+        if area_vnum not in self.unloaded:
+            return False
+
+        self.unloaded.discard(area_vnum)
+        area = self.get({"vnum": area_vnum})
+        stored = self.storage.read_members(area.get_data())
+
+        for key, collection in self.get_member_collections():
+            # Members kept in memory when the Area was unloaded are newer.
+            records = [entity for entity in stored.get(key, [])
+                       if entity["id"] not in collection.data]
+            for entity in records:
+                entity["area_vnum"] = area.vnum
+                entity["area_id"] = area.id
+
+            collection.storage.loaded(records)
+            collection.insert(records)
+
+        self.visited[area_vnum] = time.time()
+        logging.info("Loaded Area {}".format(area_vnum))
+
+        if getattr(self.game, "running", False):
+            area.broadcast("after:spawn")
+
+        return True
+
+    def unload_members(self, area, active=None):
+        """
+        Write out an Area's members and remove them from memory.
+
+        Members that have wandered into one of the active Areas, by default
+        every other loaded Area, or that a Character carries, stay loaded.
+        Returns if the Area was unloaded.
+        """
+        if self.storage.has_unsaved(area):
+            area.save()
+        self.flush(area)
+
+        # A failed write keeps the changes, dropping the members loses them.
+        if self.storage.has_unsaved(area):
+            logging.error("Unable to unload Area {}, its changes are not "
+                          "saved".format(area.vnum))
+            return False
+
+        if active is None:
+            active = set(
+                record["vnum"] for record in self.data.values()
+                if record["vnum"] not in self.unloaded)
+            active.discard(area.vnum)
+
+        for key, collection in self.get_member_collections():
+            records = [
+                record
+                for record in collection.find_records({"area_vnum": area.vnum})
+                if not self.is_member_away(record, active)]
+            collection.evict(records)
+            collection.storage.unloaded(area.vnum, records)
+
+        self.unloaded.add(area.vnum)
+        self.visited.pop(area.vnum, None)
+        logging.info("Unloaded Area {}".format(area.vnum))
+        return True
+
+    @inject("Rooms")
+    def is_member_away(self, record, active, Rooms):
+        """Return if a member is held or somewhere that is still loaded."""
+        if record.get("character_id", None):
+            return True
+
+        room = Rooms.data.get(record.get("room_id", None), None)
+        return room is not None and room.get("area_vnum", None) in active
+
+    @inject("Characters", "Rooms")
+    def unload_idle(self, Characters, Rooms):
+        """Unload every Area no player has been in for a while."""
+        now = time.time()
+        for character in Characters.query({"online": True}):
+            room = Rooms.data.get(character.room_id, None)
+            if room and room.get("area_vnum", None):
+                self.visited[room["area_vnum"]] = now
+
+        idle_seconds = settings.AREA_IDLE_MINUTES * 60
+        loaded = [area for area in self.query()
+                  if area.vnum not in self.unloaded]
+        idle = [area for area in loaded
+                if now - self.visited.get(area.vnum, now) >= idle_seconds]
+
+        # Members of an idle Area which are in another one stay loaded.
+        active = set(area.vnum for area in loaded) - \
+            set(area.vnum for area in idle)
+        for area in idle:
+            self.unload_members(area, active)
+
+    def dehydrate(self, record):
         """Save the Area to a file."""
+        area_vnum = record["vnum"]
+        record = dict(record)
+
+        stored = {}
+        if area_vnum in self.unloaded:
+            # Rewriting an idle Area leaves it unloaded, its members are the
+            # ones stored, apart from any still in memory or changed since.
+            stored = self.storage.read_members(record)
+        changes = self.storage.changes.get(area_vnum, {})
+
+        for key, collection in self.get_member_collections():
+            members = {
+                entity["id"]: entity for entity in stored.get(key, [])
+                if (key, entity["id"]) not in changes}
+            for entity in collection.query(
+                    {"area_vnum": area_vnum}, as_dict=True):
+                members[entity["id"]] = entity
+
+            record[key] = [
+                self.dehydrate_member(entity) for entity in members.values()]
 
-        query_args = [{"area_vnum": record["vnum"]}]
-        query_kwargs = {"as_dict": True}
+        return record
 
-        record["rooms"] = list(Rooms.query(*query_args, **query_kwargs))
-        record["actors"] = list(Actors.query(*query_args, **query_kwargs))
-        record["objects"] = list(Objects.query(*query_args, **query_kwargs))
-        record["scripts"] = list(Scripts.query(*query_args, **query_kwargs))
+    def dehydrate_member(self, record):
+        """Copy a member record without the keys its Area file implies."""
+        # Scrub copies, the stored records are still indexed by these.
+        record = dict(record)
 
         scrub_keys = ["area_id", "area_vnum"]
-        keys = ["rooms", "actors", "objects", "scripts"]
-        for key in keys:
-            for entity in record[key]:
-                for scrub_key in scrub_keys:
-                    if scrub_key in entity:
-                        del entity[scrub_key]
+        for scrub_key in scrub_keys:
+            if scrub_key in record:
+                del record[scrub_key]
 
         return record
 
@@ -1578,6 +2281,8 @@ class Areas(Collection):
 
 
 class RoomExit(Entity):
+    DEFAULT_DATA = {}
+
     def __init__(self, data, room):
         super(RoomExit, self).__init__(data)
         super(Entity, self).__setattr__("from_room", room)
@@ -1592,7 +2297,7 @@ class RoomExit(Entity):
         return Rooms.get({"vnum": self.room_vnum})
 
     def save(self):
-        self.room.save()
+        self.from_room.save()
 
 
 class Room(Entity):
@@ -1621,6 +2326,9 @@ class Room(Entity):
                 yield entity
 
     def echo(self, message):
+        if not isinstance(message, Broadcast):
+            message = Broadcast(message)
+
         for child in self.children:
             child.echo(message)
 
@@ -1639,6 +2347,14 @@ class Room(Entity):
         exits = self._data.get("exits", {})
         return {k: RoomExit(v, self) for k, v in exits.items()}
 
+    def set_exit(self, direction_id, room_vnum):
+        """Point an exit at a Room, changes are kept once the Room saves."""
+        exits = self._data.setdefault("exits", {})
+        exits[direction_id] = {"room_vnum": room_vnum}
+
+    def remove_exit(self, direction_id):
+        self._data.get("exits", {}).pop(direction_id, None)
+
 
 class Direction(Entity):
     pass
@@ -1646,6 +2362,27 @@ class Direction(Entity):
 
 class Rooms(Collection):
     ENTITY_CLASS = Room
+    STORAGE_CLASS = AreaMemberStorage
+    INDEXES = ("vnum", "area_id", "area_vnum")
+
+    def __init__(self, *args, **kwargs):
+        self.graph = RoomGraph(settings.DIRECTIONS)
+        self.map_cache = OrderedDict()
+        super(Rooms, self).__init__(*args, **kwargs)
+
+    def insert(self, records):
+        super(Rooms, self).insert(records)
+        self.graph.update_rooms(records)
+
+    def save(self, record, skip_storage=False):
+        room = super(Rooms, self).save(record, skip_storage=skip_storage)
+        self.graph.update_room(room.get_data())
+        return room
+
+    def delete(self, record):
+        record = self.unwrap_record(record)
+        super(Rooms, self).delete(record)
+        self.graph.remove_room(record)
 
     @inject("Areas")
     def fuzzy_get(self, identifier, Areas):
@@ -1667,6 +2404,7 @@ class Rooms(Collection):
             if not area:
                 return None
 
+            Areas.load_members(area.vnum)
             for room in self.query({"area_vnum": area.vnum}):
                 if room.vnum.startswith(room_vnum):
                     return room
@@ -1675,11 +2413,144 @@ class Rooms(Collection):
         else:
             room_vnum = identifier.lower()
 
+            self.storage.load_matching(room_vnum)
             for room in self.query():
                 if room.vnum.startswith(room_vnum):
                     return room
 
 
+class Pathfinder(Injector):
+    """
+    Routes and distances between Rooms, searched over the Rooms graph.
+
+    Rooms may be given as Room entities or vnums.  Recent routes are kept
+    until the exits of the world change.
+    """
+
+    def __init__(self, game):
+        super(Pathfinder, self).__init__(game)
+        self.routes = OrderedDict()
+
+    @property
+    def graph(self):
+        return self.game.get_injector("Rooms").graph
+
+    def get_index(self, room):
+        vnum = room if isinstance(room, str) else room.vnum
+        index = self.graph.index.get(vnum, None)
+        if index is None or not self.graph.known[index]:
+            return None
+        return index
+
+    def find_path(self, start, goal, max_distance=None):
+        """Return the directions of a shortest route, or None if none."""
+        graph = self.graph
+        start = self.get_index(start)
+        goal = self.get_index(goal)
+        if start is None or goal is None:
+            return None
+
+        key = (start, goal, max_distance, graph.version)
+        if key in self.routes:
+            self.routes.move_to_end(key)
+            route = self.routes[key]
+        else:
+            route = self.search(start, goal, max_distance)
+            self.routes[key] = route
+            if len(self.routes) > settings.PATHFINDER_CACHE_SIZE:
+                self.routes.popitem(last=False)
+
+        return None if route is None else list(route)
+
+    def search(self, start, goal, max_distance=None):
+        """Breadth first search from start, stopping once goal is found."""
+        if start == goal:
+            return ()
+
+        graph = self.graph
+        known = graph.known
+        exits = [(direction, graph.exits[direction])
+                 for direction in graph.directions]
+
+        # Room to the (previous room, direction) it was first reached by.
+        previous = {start: (None, None)}
+        frontier = [start]
+        distance = 0
+
+        while frontier:
+            if max_distance is not None and distance >= max_distance:
+                return None
+            distance += 1
+
+            next_frontier = []
+            for room in frontier:
+                for direction, targets in exits:
+                    target = targets[room]
+                    if target < 0 or not known[target] or \
+                            target in previous:
+                        continue
+                    previous[target] = (room, direction)
+                    if target == goal:
+                        return self.join(previous, goal)
+                    next_frontier.append(target)
+            frontier = next_frontier
+
+        return None
+
+    def join(self, previous, goal):
+        directions = []
+        room = goal
+        while previous[room][0] is not None:
+            room, direction = previous[room]
+            directions.append(direction)
+        directions.reverse()
+        return tuple(directions)
+
+    def flood(self, rooms, max_distance):
+        """Return the distance to every Room within reach of any of rooms."""
+        graph = self.graph
+        known = graph.known
+        exits = [graph.exits[direction] for direction in graph.directions]
+
+        distances = {}
+        frontier = []
+        for room in rooms:
+            index = self.get_index(room)
+            if index is not None and index not in distances:
+                distances[index] = 0
+                frontier.append(index)
+
+        distance = 0
+        while frontier and distance < max_distance:
+            distance += 1
+            next_frontier = []
+            for room in frontier:
+                for targets in exits:
+                    target = targets[room]
+                    if target < 0 or not known[target] or \
+                            target in distances:
+                        continue
+                    distances[target] = distance
+                    next_frontier.append(target)
+            frontier = next_frontier
+
+        vnums = graph.vnums
+        return {vnums[index]: value for index, value in distances.items()}
+
+    def distances(self, room, max_distance):
+        """Return the distance to every Room within reach of a Room."""
+        return self.flood([room], max_distance)
+
+    @inject("Characters")
+    def characters_near(self, room, max_distance, Characters):
+        """Return (Character, distance) for players within reach."""
+        distances = self.distances(room, max_distance)
+        return [
+            (character, distances[character.room_vnum])
+            for character in Characters.query({"online": True})
+            if character.room_vnum in distances]
+
+
 class Script(Entity):
     def execute(self, entity, event):
         try:
@@ -1751,6 +2622,8 @@ class Script(Entity):
 
 class Scripts(Collection):
     ENTITY_CLASS = Script
+    STORAGE_CLASS = AreaMemberStorage
+    INDEXES = ("vnum", "area_vnum")
 
 
 class Behavior(Entity):
@@ -1763,13 +2636,19 @@ class Behavior(Entity):
 class Behaviors(Collection):
     ENTITY_CLASS = Behavior
     STORAGE_CLASS = FileStorage
+    INDEXES = ("vnum",)
 
 
 class Characters(Collection):
     PERSISTENT = True
-    STORAGE_CLASS = FileStorage
+    STORAGE_CLASS = {
+        "file": FileStorage,
+        "journal": JournalStorage,
+        "sqlite": SQLiteStorage,
+    }[settings.CHARACTER_STORAGE]
     STORAGE_FILENAME_FIELD = "name"
     ENTITY_CLASS = Character
+    INDEXES = ("room_id", "online", "name")
 
     def fuzzy_get(self, name, online=True, visible=True):
         filters = {}
@@ -1809,10 +2688,13 @@ class Races(Collection):
 
 class Actors(Collection):
     ENTITY_CLASS = Actor
+    STORAGE_CLASS = AreaMemberStorage
+    INDEXES = ("room_id", "vnum", "area_vnum")
 
 
 class Objects(Collection):
-    pass
+    STORAGE_CLASS = AreaMemberStorage
+    INDEXES = ("room_id", "area_vnum")
 
 
 class Directions(Collection):
@@ -1835,6 +2717,15 @@ class TickManager(TimerManager):
         self.game.broadcast("after:tick", unblockable=True)
 
 
+class AreaManager(TimerManager):
+    TIMER_DELAY = 60.0
+
+    @inject("Areas")
+    def tick(self, Areas):
+        if settings.AREA_LAZY_LOADING:
+            Areas.unload_idle()
+
+
 class CoreModule(Module):
     DESCRIPTION = "The basics of the game, primarily data models"
 
@@ -1851,6 +2742,7 @@ class CoreModule(Module):
         self.game.register_injector(Classes)
         self.game.register_injector(Races)
         self.game.register_injector(Areas)
+        self.game.register_injector(Pathfinder)
 
         for dir_name in settings.DIRECTIONS:
             self.game.register_command(dir_name, direction_command)
@@ -1887,8 +2779,11 @@ class CoreModule(Module):
         self.game.register_command("open", open_command)
         self.game.register_command("close", close_command)
         self.game.register_command("sockets", sockets_command)
+        self.game.register_command("queries", queries_command)
+        self.game.register_command("path", path_command)
 
         self.game.register_manager(TickManager)
+        self.game.register_manager(AreaManager)
 
         directions, characters, rooms, areas = \
             self.game.get_injectors(
@@ -6,6 +6,7 @@ from utils.tablefy import tablefy
 class Socials(Collection):
     ENTITY_CLASS = Entity
     STORAGE_CLASS = FileStorage
+    INDEXES = ("name",)
 
 @inject("Socials")
 def socials_command(self, Socials, *args, **kwargs):
@@ -15,7 +16,8 @@ def socials_command(self, Socials, *args, **kwargs):
         all_socials.append(social.name)
 
     if all_socials:
-        msg = tablefy(all_socials)
+        width, _ = self.terminal_size
+        msg = tablefy(all_socials, width=(width or 80) - 1)
         self.echo(msg)
     else:
         self.echo("There are no social commands loaded.")
@@ -8,10 +8,16 @@ from mud.module import Module
 from utils.ansi import colorize, decolorize
 from utils.hash import hash_password, password_is_valid
 from utils.fuzzy_resolver import FuzzyResolver
+from utils.telnet import TelnetProtocol
+from collections import deque
+from itertools import islice
 
+import codecs
 import gevent
+import logging
 import settings
 import socket as raw_socket
+import zlib
 
 monkey.patch_all()
 
@@ -498,6 +504,7 @@ Your choice? """)
     @inject("Characters")
     def save_temporary_actor(self, Characters):
         actor = Characters.save(self.temporary_actor)
+        Characters.flush(actor)
         self.connection.actor_id = actor.id
 
     def start_motd(self):
@@ -524,6 +531,11 @@ Welcome to Waterdeep 'City Of Splendors'!  Please obey the rules, (help rules).
         self.connection.close()
         self.actor.act("{self.name} slowly fades out of existence.")
 
+    @property
+    def color_variant(self):
+        """The Broadcast rendering this client is sent."""
+        return "ansi" if self.color else "plain"
+
     def write(self, message=""):
         if self.state == "playing" and not self.write_ended_with_newline:
             message = "\n" + message
@@ -539,6 +551,22 @@ Welcome to Waterdeep 'City Of Splendors'!  Please obey the rules, (help rules).
         if not self.prompt_thread:
             self.prompt_thread = gevent.spawn(self.write_prompt)
 
+    def write_broadcast(self, broadcast):
+        connection = self.connection
+        if broadcast.low_priority and connection.throttled:
+            connection.dropped_count += 1
+            return
+
+        if self.state == "playing" and not self.write_ended_with_newline:
+            connection.write("\n")
+
+        # Broadcast lines always end with a newline.
+        self.write_ended_with_newline = True
+
+        connection.write_encoded(broadcast.render(self.color_variant))
+        if not self.prompt_thread:
+            self.prompt_thread = gevent.spawn(self.write_prompt)
+
     def format_prompt_template(self, template):
         output = template
 
@@ -632,6 +660,7 @@ Welcome to Waterdeep 'City Of Splendors'!  Please obey the rules, (help rules).
                 "{W%r{8({w%q{8/{w%t{8) {W%a{8]{x")
 
         self.write(self.format_prompt_template(template))
+        self.connection.end_prompt()
 
     @inject("Characters")
     def handle_playing_input(self, message, Characters, allow_proxy=True):
@@ -693,14 +722,33 @@ Welcome to Waterdeep 'City Of Splendors'!  Please obey the rules, (help rules).
 
 
 class TelnetConnection(Connection):
+    # How many queued chunks one vectored send may carry.
+    MAX_SEND_CHUNKS = 64
+
     def __init__(self, server, socket, address):
         super(TelnetConnection, self).__init__(server)
-        self.read_buffer = ""
-        self.write_buffer = ""
+        # Input is decoded as it arrives, so characters split between two
+        # reads survive, and the unfinished line is kept as a list of parts.
+        self.decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.read_buffer = []
+        self.read_length = 0
+        # Encoded output waiting to be sent, oldest first.
+        self.write_queue = deque()
+        self.write_queue_size = 0
+        # Whether low priority output is being dropped, and how much was.
+        self.throttled = False
+        self.dropped_count = 0
         self.socket = socket
         self.hostname = address[0]
         self.port = address[1]
         self.flush_thread = None
+        # Whether a greenlet is waiting in a send on the socket.
+        self.sending = False
+        self.compressor = None
+        self.compressor_pending = False
+        self.protocol = TelnetProtocol(
+            self.write_encoded,
+            self.set_compression if settings.TELNET_COMPRESSION_LEVEL else None)
 
     @property
     def actor(self):
@@ -711,15 +759,22 @@ class TelnetConnection(Connection):
 
         return client.actor
 
+    @property
+    def terminal_size(self):
+        return self.protocol.width, self.protocol.height
+
     def start(self):
+        self.protocol.start()
         self.client = TelnetClient(self)
         gevent.spawn(self.read)
 
     def close(self):
-        try:
-            self.flush()
-        except Exception:
-            pass
+        # A flush waiting in a send stops once the socket is gone.
+        if not self.sending:
+            try:
+                self.flush()
+            except Exception:
+                pass
 
         try:
             self.socket.shutdown(raw_socket.SHUT_WR)
@@ -745,38 +800,161 @@ class TelnetConnection(Connection):
                 self.close()
                 break
 
-            try:
-                self.read_buffer += raw.decode("utf-8").replace("\r\n", "\n")
-            except Exception:
-                pass
+            text = self.decoder.decode(self.protocol.feed(raw))
+            inputs = self.split_lines(text)
+            if inputs:
+                self.client.handle_inputs(self.limit_pending(inputs))
+
+    def split_lines(self, text):
+        """Return the lines text completes, keeping the unfinished one."""
+        parts = text.split("\n")
+
+        lines = []
+        for part in parts[:-1]:
+            self.add_to_line(part)
+            lines.append("".join(self.read_buffer).rstrip("\r"))
+            self.read_buffer = []
+            self.read_length = 0
+
+        self.add_to_line(parts[-1])
+        return lines
+
+    def add_to_line(self, text):
+        # Anything past the maximum line length is ignored.
+        room = settings.TELNET_MAX_LINE_LENGTH - self.read_length
+        if room <= 0 or not text:
+            return
 
-            if "\n" in self.read_buffer:
-                split = self.read_buffer.split("\n")
-                inputs = split[:-1]
-                self.read_buffer = split[-1]
+        text = text[:room]
+        self.read_buffer.append(text)
+        self.read_length += len(text)
 
-                self.client.handle_inputs(inputs)
+    def limit_pending(self, inputs):
+        room = settings.TELNET_MAX_PENDING_LINES - len(self.client.inputs)
+        if len(inputs) <= room:
+            return inputs
+
+        self.write("Too many commands are waiting, some were ignored.\n")
+        return inputs[:max(0, room)]
 
     def write(self, message=""):
         if not self.socket:
             return
 
         message = message.replace("\n", "\r\n")
-        self.write_buffer += message
+        self.write_encoded(message.encode())
+
+    def end_prompt(self):
+        """Tell the client the prompt just written is complete."""
+        self.write_encoded(self.protocol.get_prompt_end())
 
-        if not self.flush_thread:
+    def write_encoded(self, data):
+        """Queue bytes that are already rendered for the wire."""
+        if not self.socket or not data:
+            return
+
+        if self.compressor:
+            # Compressed output is flushed to the client with each flush.
+            self.compressor_pending = True
+            data = self.compressor.compress(data)
+
+        self.queue_output(data)
+
+        if self.socket and not self.flush_thread:
             self.flush_thread = gevent.spawn(self.start_flush_thread)
 
+    def queue_output(self, data):
+        if not data:
+            return
+
+        self.write_queue.append(data)
+        self.write_queue_size += len(data)
+
+        if self.write_queue_size >= settings.TELNET_OUTPUT_LIMIT:
+            logging.warning(
+                "Disconnecting {}:{}, {} bytes of output are waiting".format(
+                    self.hostname, self.port, self.write_queue_size))
+            self.write_queue.clear()
+            self.write_queue_size = 0
+            self.compressor = None
+            self.close()
+            return
+
+        if self.write_queue_size >= settings.TELNET_OUTPUT_HIGH_WATER:
+            self.throttled = True
+
+    def set_compression(self, enabled):
+        """Start or end MCCP2 compression of everything written after."""
+        if enabled:
+            self.compressor = zlib.compressobj(
+                settings.TELNET_COMPRESSION_LEVEL)
+            self.compressor_pending = False
+        elif self.compressor:
+            compressor = self.compressor
+            self.compressor = None
+            self.queue_output(compressor.flush(zlib.Z_FINISH))
+
     def start_flush_thread(self):
         gevent.sleep(0.05)
         self.flush()
 
+    def send_queued(self):
+        """Send as much of the write queue as the socket takes at once."""
+        chunks = list(islice(self.write_queue, self.MAX_SEND_CHUNKS))
+
+        if hasattr(self.socket, "sendmsg"):
+            return self.socket.sendmsg(chunks)
+
+        return self.socket.send(chunks[0])
+
     def flush(self):
         if not self.socket:
             return
 
-        self.socket.send(self.write_buffer.encode())
-        self.write_buffer = ""
+        queue = self.write_queue
+        while True:
+            if self.compressor and self.compressor_pending:
+                self.compressor_pending = False
+                self.queue_output(self.compressor.flush(zlib.Z_SYNC_FLUSH))
+
+            if not queue or not self.socket:
+                break
+
+            self.sending = True
+            try:
+                sent = self.send_queued()
+            except (BlockingIOError, InterruptedError):
+                sent = 0
+            except OSError:
+                # The client is gone, reading notices and closes it.
+                self.write_queue.clear()
+                self.write_queue_size = 0
+                break
+            finally:
+                self.sending = False
+
+            # Disconnected while the send waited, the queue was dropped.
+            if not self.socket or not queue:
+                break
+
+            if not sent:
+                # Keep the unsent tail and try again on the next flush.
+                self.flush_thread = gevent.spawn(self.start_flush_thread)
+                return
+
+            self.write_queue_size -= sent
+            while sent:
+                chunk = queue[0]
+                if sent < len(chunk):
+                    queue[0] = memoryview(chunk)[sent:]
+                    break
+
+                queue.popleft()
+                sent -= len(chunk)
+
+            if self.write_queue_size <= settings.TELNET_OUTPUT_LOW_WATER:
+                self.throttled = False
+
         self.flush_thread = None
 
 
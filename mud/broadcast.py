@@ -0,0 +1,35 @@
+from mud.connection import Connection
+from utils.ansi import colorize, decolorize
+
+
+class Broadcast(object):
+    """
+    A line of output sent to many clients at once.
+
+    Each color variant is rendered and encoded the first time a client asks
+    for it, every later client of that variant gets the same bytes.  Low
+    priority lines are dropped for clients that are falling behind.
+    """
+    RENDERERS = {
+        "ansi": colorize,
+        "plain": decolorize,
+    }
+    ENCODING = "utf-8"
+
+    def __init__(self, message, low_priority=False):
+        self.message = str(message)
+        self.low_priority = low_priority
+        self.rendered = {}
+
+    def __str__(self):
+        return self.message
+
+    def render(self, variant):
+        """Return the line colored for variant and encoded for the wire."""
+        encoded = self.rendered.get(variant)
+        if encoded is None:
+            output = self.RENDERERS[variant](self.message + "\n")
+            encoded = output.replace("\n", Connection.NEWLINE).encode(
+                self.ENCODING)
+            self.rendered[variant] = encoded
+        return encoded
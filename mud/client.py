@@ -76,3 +76,7 @@ class Client(object):
 
     def writeln(self, message=""):
         self.write(message + "\n")
+
+    def write_broadcast(self, broadcast):
+        """Write a Broadcast line, shared with other clients."""
+        self.writeln(broadcast.message)
@@ -1,72 +1,345 @@
 from mud.injector import Injector
+from mud.index import CollectionIndex
 from mud.event import Event
 from mud.inject import inject
+from mud.serializers import UnavailableSerializer, get_serializer
+from mud.snapshot import get_stamp
 from utils.hash import get_random_hash
+from collections import Counter
+from copy import deepcopy
+from gevent.threadpool import ThreadPool
 
 import gevent
+import gevent.lock
 import glob
+import hashlib
 import json
 import logging
 import os
 import os.path
 import settings
+import sqlite3
+import time
+import weakref
 
 
 class CollectionStorage(object):
+    # The STORAGE_FORMATs this storage can keep records in, None for any.
+    FORMATS = None
+
     def __init__(self, collection):
         self.collection = collection
 
+    def get_serializer(self):
+        """Return the Serializer for the Collection's STORAGE_FORMAT."""
+        name = self.collection.STORAGE_FORMAT
+        if self.FORMATS is not None and name not in self.FORMATS:
+            raise UnavailableSerializer(
+                "{} cannot store the {} format".format(
+                    self.__class__.__name__, name))
+        return get_serializer(name)
+
     def post_save(self, record):
         pass
 
     def post_delete(self, record):
         pass
 
+    def flush(self, record=None):
+        """Write out anything not yet persisted, or only the given record."""
+        pass
+
+    def snapshot(self, snapshot):
+        """Add the records as they are stored to a Snapshot."""
+        pass
+
+    def load_missing(self, spec):
+        """Load the records a failed get was looking for, if possible."""
+        return False
+
+    def store_loaded(self, records, started):
+        """Insert and hydrate the records loaded at startup."""
+        name = self.collection.__class__.__name__
+        self.collection.insert(records)
+
+        for data in records:
+            try:
+                self.collection.hydrate(data)
+            except Exception as e:
+                self.collection.game.handle_exception(e)
+                logging.error("Unable to load {} record: {}".format(
+                    name, data.get("vnum", data.get("id", None))))
+
+        logging.info("Loaded {} {} records in {:.3f}s".format(
+            len(records), name, time.time() - started))
+
+    def read_legacy_files(self):
+        """Read the files a FileStorage wrote for this Collection, by id."""
+        name = self.collection.__class__.__name__.lower()
+        serializer = get_serializer(self.collection.STORAGE_FORMAT)
+        pattern = "{}/{}/*.{}".format(
+            settings.DATA_FOLDER, name, serializer.SUFFIX)
+        mode = "rb" if serializer.BINARY else "r"
+
+        records = {}
+        for path in glob.glob(pattern):
+            try:
+                with open(path, mode) as fh:
+                    record = serializer.loads(fh.read())
+                records[record.setdefault("id", get_random_hash())] = record
+            except Exception as e:
+                self.collection.game.handle_exception(e)
+                logging.error("Unable to parse file: {}".format(path))
+
+        return records
+
 
 class MemoryStorage(CollectionStorage):
     pass
 
 
 class FileStorage(CollectionStorage):
+    """
+    Store each record as a JSON file in the Collection's data folder.
+
+    Saves are written behind: a saved record is queued and written once the
+    flush delay passes, so repeated saves of a record are coalesced into one
+    write, and a write is skipped when the file already holds the same
+    contents, known by a digest of what was last read or written.  Files
+    are written and removed by a shared pool of threads so a slow disk does
+    not stall the game loop.
+    """
+    THREADPOOL = None
+
     def __init__(self, *args, **kwargs):
         super(FileStorage, self).__init__(*args, **kwargs)
         name = self.collection.__class__.__name__.lower()
         self.folder = "{}/{}".format(settings.DATA_FOLDER, name)
+        self.serializer = self.get_serializer()
+
+        self.pending = {}
+        self.written = {}
+        self.running = {}
+        self.queued = {}
+        self.flush_timer = None
 
         self.load_initial_data()
 
+    def get_paths(self):
+        pattern = "{}/*{}".format(self.folder, self.get_filename_suffix())
+        return glob.glob(pattern)
+
     def load_initial_data(self):
-        pattern = "{}/*".format(self.folder)
-        for path in glob.glob(pattern):
-            with open(path, "r") as fh:
-                try:
-                    data = json.loads(fh.read())
-                    record = self.collection.save(data, skip_storage=True)
-                    self.collection.hydrate(data)
-                    logging.debug("Stored {}: {}".format(
-                        self.collection.__class__.__name__, record.vnum))
-
-                except Exception as e:
-                    self.collection.game.handle_exception(e)
-                    logging.error("Unable to parse file: {}".format(path))
+        """
+        Take the files unchanged since the snapshot from it, then read and
+        parse the rest in the pool, and store them all.
+        """
+        started = time.time()
+        snapshot = self.collection.game.snapshot
+
+        records = []
+        missed = []
+        for path in self.get_paths():
+            entry = snapshot.pop(path, [path])
+            if entry is None:
+                missed.append(path)
+                continue
 
-    def get_record_path(self, record):
-        filename = record[self.collection.STORAGE_FILENAME_FIELD]
-        format_name = self.collection.STORAGE_FORMAT
+            record, digest = entry
+            self.written[path] = digest
+            try:
+                records.append(self.read_record(path, record))
+            except Exception as e:
+                self.collection.game.handle_exception(e)
+                logging.error("Unable to load file: {}".format(path))
+
+        for path, data, error in self.get_threadpool().imap(
+                self.load_file, missed):
+            if error is not None:
+                self.collection.game.handle_exception(error)
+                logging.error("Unable to parse file: {}".format(path))
+                continue
+            records.append(data)
+
+        self.store_loaded(records, started)
+
+    def load_file(self, path):
+        """Read and parse one data file, run in the pool."""
+        try:
+            contents, _ = self.read_file(path)
+            self.written[path] = self.get_digest(contents)
+            record = self.parse_contents(contents)
+            return path, self.read_record(path, record), None
+        except Exception as e:
+            return path, None, e
+
+    def read_file(self, path):
+        """Return a file's contents and the stamp of what was read."""
+        with open(path, self.get_file_mode("r")) as fh:
+            contents = fh.read()
+            # Of the file read, even if it was replaced since it was opened.
+            return contents, get_stamp(os.fstat(fh.fileno()))
+
+    def parse_contents(self, contents):
+        return self.serializer.loads(contents)
+
+    def get_digest(self, contents):
+        """Return a short fingerprint of a file's contents."""
+        if isinstance(contents, str):
+            contents = contents.encode("utf-8")
+        return hashlib.blake2b(contents, digest_size=16).digest()
+
+    def read_record(self, path, record):
+        """Finish loading a record parsed from a data file."""
+        return record
+
+    def snapshot(self, snapshot):
+        # Records in memory may have changes not written yet, so the files
+        # are read again instead.
+        snapshot.defer(self.snapshot_files)
+
+    def snapshot_files(self, snapshot):
+        """Read every data file into the Snapshot, run in the pool."""
+        for path in self.get_paths():
+            try:
+                contents, stamp = self.read_file(path)
+            except OSError:
+                continue
+
+            record = self.parse_contents(contents)
+            snapshot.add(
+                path, {path: stamp}, (record, self.get_digest(contents)))
 
+    def get_filename_suffix(self):
         suffix = self.collection.STORAGE_FILENAME_SUFFIX
         if suffix != "":
             if suffix is None:
-                suffix = format_name
+                suffix = self.serializer.SUFFIX
             suffix = "." + suffix
+        return suffix
+
+    def get_file_mode(self, mode):
+        return mode + "b" if self.serializer.BINARY else mode
+
+    def get_record_path(self, record):
+        filename = record[self.collection.STORAGE_FILENAME_FIELD]
 
         return "{}/{}{}".format(
             self.folder,
             filename,
-            suffix)
+            self.get_filename_suffix())
+
+    @classmethod
+    def get_threadpool(cls):
+        """Return the worker pool shared by every FileStorage."""
+        if FileStorage.THREADPOOL is None:
+            FileStorage.THREADPOOL = ThreadPool(settings.STORAGE_THREADS)
+        return FileStorage.THREADPOOL
 
     def post_save(self, record):
         path = self.get_record_path(record)
+        self.pending[path] = record
+
+        if self.flush_timer is None:
+            self.flush_timer = gevent.spawn_later(
+                settings.STORAGE_FLUSH_DELAY, self.write_pending)
+
+    def post_delete(self, record):
+        path = self.get_record_path(record)
+        self.pending.pop(path, None)
+        self.written.pop(path, None)
+        self.queue_operation(path, self.remove_file, None)
+
+    def flush(self, record=None):
+        """Write pending records and wait until they are on disk."""
+        self.write_pending(record)
+        self.wait()
+
+    def wait(self):
+        """Block the current greenlet until no file operations are running."""
+        while self.running:
+            gevent.wait(list(self.running.values()))
+
+    def write_pending(self, record=None):
+        if record is None:
+            self.flush_timer = None
+            pending, self.pending = self.pending, {}
+        else:
+            path = self.get_record_path(record)
+            if path not in self.pending:
+                return
+            pending = {path: self.pending.pop(path)}
+
+        for path, pending_record in pending.items():
+            try:
+                self.write_record(path, pending_record)
+            except Exception as e:
+                self.collection.game.handle_exception(e)
+                logging.error("Unable to write file: {}".format(path))
+
+    def write_record(self, path, record):
+        """Queue a record's file to be written, unless it is unchanged."""
+        # Records are changed by other greenlets, so they are serialized
+        # here on the loop and only the file I/O is handed to the pool.
+        storage_record = self.dehydrate_record(path, record)
+        contents = self.serializer.dumps(storage_record)
+
+        digest = self.get_digest(contents)
+        if self.written.get(path, None) == digest:
+            return False
+
+        self.written[path] = digest
+        self.queue_operation(path, self.write_file, contents)
+
+        return True
+
+    def dehydrate_record(self, path, record):
+        """Return what is written to a record's file."""
+        return self.collection.dehydrate(record)
+
+    def queue_operation(self, path, func, contents, replaces=True):
+        """
+        Run a file operation in the pool, one at a time per path.
+
+        Operations which replace the whole file make anything still queued
+        for the path redundant, others run in the order they were queued.
+        """
+        if path in self.running:
+            queued = self.queued.setdefault(path, [])
+            if replaces:
+                del queued[:]
+            queued.append((func, contents))
+            return
+
+        result = self.get_threadpool().spawn(func, path, contents)
+        self.running[path] = result
+        result.rawlink(lambda result: self.finish_operation(
+            path, func, contents, result))
+
+    def finish_operation(self, path, func, contents, result):
+        del self.running[path]
+
+        if result.successful():
+            self.operation_succeeded(path, func, contents)
+        else:
+            self.operation_failed(path, func, contents, result.exception)
+
+        queued = self.queued.pop(path, None)
+        if queued:
+            func, contents = queued.pop(0)
+            self.queue_operation(path, func, contents)
+            if queued:
+                self.queued[path] = queued
+
+    def operation_succeeded(self, path, func, contents):
+        pass
+
+    def operation_failed(self, path, func, contents, error):
+        # Forget the contents so the next save tries the write again.
+        self.written.pop(path, None)
+        logging.error("Unable to write file {}: {}".format(path, error))
+
+    def write_file(self, path, contents):
         folders = path.split("/")
         folder = "/".join(folders[:-1])
 
@@ -74,14 +347,459 @@ class FileStorage(CollectionStorage):
 
         temp_path = path + ".TMP"
 
-        with open(temp_path, "w") as fh:
-            fh.write(json.dumps(record, indent=4, sort_keys=True))
+        with open(temp_path, self.get_file_mode("w")) as fh:
+            fh.write(contents)
 
         os.replace(temp_path, path)
 
+    def remove_file(self, path, contents=None):
+        if os.path.exists(path):
+            os.remove(path)
+
+
+class JournalStorage(CollectionStorage):
+    """
+    Store a Collection as a compacted snapshot plus a journal of changes.
+
+    Saves and deletes are batched on the flush delay and appended to the
+    current journal segment, one line of JSON each.  A new segment is begun
+    every settings.JOURNAL_SEGMENT_SIZE bytes, and once
+    settings.JOURNAL_COMPACT_SEGMENTS of them are full every record is
+    compacted into a new snapshot and the segments are removed.  Loading
+    reads the snapshot and replays the segments written after it.
+    """
+    SNAPSHOT_FILENAME = "snapshot.json"
+    SEGMENT_FILENAME = "{:08d}.log"
+    # Every record is one line of the journal, so only compact JSON will do.
+    FORMATS = ("json", "orjson")
+
+    def __init__(self, *args, **kwargs):
+        super(JournalStorage, self).__init__(*args, **kwargs)
+        name = self.collection.__class__.__name__.lower()
+        self.folder = "{}/journals/{}".format(settings.DATA_FOLDER, name)
+        self.serializer = self.get_serializer()
+
+        self.pending = {}
+        self.flush_timer = None
+        self.lock = gevent.lock.Semaphore()
+        self.segment = 1
+        self.segment_size = 0
+        self.snapshot_segment = 0
+
+        self.load_initial_data()
+
+    def get_snapshot_path(self):
+        return "{}/{}".format(self.folder, self.SNAPSHOT_FILENAME)
+
+    def get_segment_path(self, segment):
+        return "{}/{}".format(
+            self.folder, self.SEGMENT_FILENAME.format(segment))
+
+    def get_segments(self):
+        """Return the numbers of the segments on disk, in order."""
+        segments = []
+        for path in glob.glob("{}/*.log".format(self.folder)):
+            try:
+                segments.append(int(os.path.basename(path).split(".")[0]))
+            except ValueError:
+                continue
+        return sorted(segments)
+
+    def get_paths(self, segments):
+        """Return the paths of the journal's files on disk."""
+        paths = [self.get_segment_path(segment) for segment in segments]
+        if os.path.exists(self.get_snapshot_path()):
+            paths.append(self.get_snapshot_path())
+        return paths
+
+    def load_initial_data(self):
+        started = time.time()
+        records = {}
+        segments = self.get_segments()
+        paths = self.get_paths(segments)
+
+        entry = None
+        if paths:
+            entry = self.collection.game.snapshot.pop(self.folder, paths)
+
+        if entry is not None:
+            self.snapshot_segment, records = entry
+        elif paths:
+            self.snapshot_segment = self.read_journal(segments, records)
+        else:
+            self.import_legacy_files(records)
+
+        # Always begin a new segment, in case the last one ends in a torn line.
+        self.segment = max(segments + [self.snapshot_segment]) + 1
+
+        self.store_loaded(list(records.values()), started)
+
+    def read_journal(self, segments, records, stamps=None):
+        """
+        Read the snapshot and replay the segments after it into records,
+        returning the last segment compacted into the snapshot.
+        """
+        snapshot_segment = self.read_snapshot(records, stamps)
+        for segment in segments:
+            if segment > snapshot_segment:
+                self.replay_segment(segment, records, stamps)
+            elif stamps is not None:
+                path = self.get_segment_path(segment)
+                stamps[path] = get_stamp(os.stat(path))
+        return snapshot_segment
+
+    def read_lines(self, path, stamps=None):
+        """Parse a file of JSON lines, skipping any that are torn."""
+        with open(path, "rb") as fh:
+            stat = os.fstat(fh.fileno())
+            # No further than the stamp, lines may be appended meanwhile.
+            contents = fh.read(stat.st_size).decode("utf-8", "replace")
+
+        if stamps is not None:
+            stamps[path] = get_stamp(stat)
+
+        entries = []
+        for line in contents.split("\n"):
+            if not line:
+                continue
+            try:
+                entries.append(self.serializer.loads(line))
+            except ValueError:
+                logging.error("Skipping journal line in {}".format(path))
+        return entries
+
+    def read_snapshot(self, records, stamps=None):
+        """Load the snapshot, returning the last segment compacted into it."""
+        path = self.get_snapshot_path()
+        if not os.path.exists(path):
+            return 0
+
+        entries = self.read_lines(path, stamps)
+        if not entries:
+            return 0
+
+        for record in entries[1:]:
+            records[record["id"]] = record
+
+        return entries[0]["segment"]
+
+    def replay_segment(self, segment, records, stamps=None):
+        path = self.get_segment_path(segment)
+        for entry in self.read_lines(path, stamps):
+            if "delete" in entry:
+                records.pop(entry["delete"], None)
+            else:
+                records[entry["save"]["id"]] = entry["save"]
+
+    def snapshot(self, snapshot):
+        # Records in memory may have changes not appended yet, so the
+        # journal is read again instead.
+        snapshot.defer(self.snapshot_journal)
+
+    def snapshot_journal(self, snapshot):
+        """Read the journal into the Snapshot, run in the pool."""
+        segments = self.get_segments()
+        if not self.get_paths(segments):
+            return
+
+        records = {}
+        stamps = {}
+        snapshot_segment = self.read_journal(segments, records, stamps)
+        snapshot.add(self.folder, stamps, (snapshot_segment, records))
+
+    def import_legacy_files(self, records):
+        """Start the journal from the files written by a FileStorage."""
+        records.update(self.read_legacy_files())
+        if not records:
+            return
+
+        # Compact right away, the journal must not depend on those files.
+        self.write_snapshot(self.serialize_snapshot(0, records.values()))
+        logging.info("Imported {} {} files into {}".format(
+            len(records), self.collection.__class__.__name__, self.folder))
+
+    def post_save(self, record):
+        self.pending[record["id"]] = record
+        self.schedule_write()
+
     def post_delete(self, record):
-        path = self.get_record_path(record)
-        os.remove(path)
+        self.pending[record["id"]] = None
+        self.schedule_write()
+
+    def schedule_write(self):
+        if self.flush_timer is None:
+            self.flush_timer = gevent.spawn_later(
+                settings.STORAGE_FLUSH_DELAY, self.write_pending)
+
+    def flush(self, record=None):
+        """Append every pending change and wait until it is on disk."""
+        self.write_pending()
+
+        # Wait for any append still running for another greenlet.
+        with self.lock:
+            pass
+
+    def serialize(self, record):
+        contents = self.serializer.dumps(self.collection.dehydrate(record))
+        if self.serializer.BINARY:
+            contents = contents.decode("utf-8")
+        return contents
+
+    def write_pending(self):
+        self.flush_timer = None
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+
+        # Records are changed by other greenlets, serialize them on the loop.
+        lines = []
+        for record_id, record in pending.items():
+            if record is None:
+                lines.append(json.dumps({"delete": record_id}))
+            else:
+                lines.append('{{"save":{}}}'.format(self.serialize(record)))
+        contents = "\n".join(lines) + "\n"
+
+        with self.lock:
+            try:
+                self.run(self.append_segment, self.segment, contents)
+            except Exception as e:
+                self.collection.game.handle_exception(e)
+                logging.error("Unable to append to journal: {}".format(
+                    self.get_segment_path(self.segment)))
+                return
+
+            # The segment size setting is in bytes, not characters.
+            self.segment_size += len(contents.encode("utf-8"))
+            if self.segment_size < settings.JOURNAL_SEGMENT_SIZE:
+                return
+
+            self.segment += 1
+            self.segment_size = 0
+            if self.segment - self.snapshot_segment > \
+                    settings.JOURNAL_COMPACT_SEGMENTS:
+                self.compact()
+
+    def compact(self):
+        """Fold every closed segment into a new snapshot, holding the lock."""
+        through = self.segment - 1
+        contents = self.serialize_snapshot(
+            through, self.collection.data.values())
+
+        try:
+            self.run(self.write_snapshot, contents)
+        except Exception as e:
+            self.collection.game.handle_exception(e)
+            logging.error("Unable to compact journal: {}".format(self.folder))
+            return
+
+        self.snapshot_segment = through
+
+    def serialize_snapshot(self, through, records):
+        lines = [json.dumps({"segment": through})]
+        lines.extend(self.serialize(record) for record in records)
+        return "\n".join(lines) + "\n"
+
+    def run(self, func, *args):
+        """Run a file operation in the storage pool and wait for it."""
+        return FileStorage.get_threadpool().apply(func, args)
+
+    def append_segment(self, segment, contents):
+        os.makedirs(self.folder, exist_ok=True)
+        with open(self.get_segment_path(segment), "a") as fh:
+            fh.write(contents)
+
+    def write_snapshot(self, contents):
+        os.makedirs(self.folder, exist_ok=True)
+
+        path = self.get_snapshot_path()
+        temp_path = path + ".TMP"
+        with open(temp_path, "w") as fh:
+            fh.write(contents)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(temp_path, path)
+
+        # Only now are the segments it covers safe to remove.
+        through = json.loads(contents[:contents.index("\n")])["segment"]
+        for segment in self.get_segments():
+            if segment <= through:
+                os.remove(self.get_segment_path(segment))
+
+
+class SQLiteStorage(CollectionStorage):
+    """
+    Store a Collection as a table of JSON records in an SQLite database.
+
+    Every field in the Collection's INDEXES is also a generated, indexed
+    column, so the database can be queried directly while the game runs.
+    Saves and deletes are batched on the flush delay and committed in one
+    transaction by the storage thread pool, and the database runs in WAL
+    mode so those commits do not block readers.
+    """
+    CONNECTIONS = {}
+    LOCK = gevent.lock.Semaphore()
+    # The indexed columns are extracted from the records by SQLite's JSON
+    # functions, so records must be stored as JSON text.
+    FORMATS = ("json", "orjson")
+
+    def __init__(self, *args, **kwargs):
+        super(SQLiteStorage, self).__init__(*args, **kwargs)
+        self.table = self.collection.__class__.__name__.lower()
+        self.serializer = self.get_serializer()
+        self.pending = {}
+        self.flush_timer = None
+
+        self.create_table()
+        self.load_initial_data()
+
+    @classmethod
+    def get_connection(cls):
+        """Return the connection to the database shared by every table."""
+        path = settings.SQLITE_DATABASE
+        if path not in cls.CONNECTIONS:
+            connection = sqlite3.connect(
+                path, check_same_thread=False, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            cls.CONNECTIONS[path] = connection
+        return cls.CONNECTIONS[path]
+
+    def get_column(self, field):
+        return "field_{}".format(field)
+
+    def create_table(self):
+        connection = self.get_connection()
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS "{}" '
+            '(id TEXT PRIMARY KEY, data TEXT NOT NULL)'.format(self.table))
+
+        columns = [row[1] for row in connection.execute(
+            'PRAGMA table_xinfo("{}")'.format(self.table))]
+
+        for field in self.collection.INDEXES:
+            column = self.get_column(field)
+            if column not in columns:
+                connection.execute(
+                    'ALTER TABLE "{}" ADD COLUMN "{}" GENERATED ALWAYS AS '
+                    '(json_extract(data, \'$.{}\')) VIRTUAL'.format(
+                        self.table, column, field))
+            connection.execute(
+                'CREATE INDEX IF NOT EXISTS "{0}_{1}" ON "{0}" ("{1}")'.format(
+                    self.table, column))
+
+    def load_initial_data(self):
+        started = time.time()
+        rows = self.get_connection().execute(
+            'SELECT data FROM "{}"'.format(self.table)).fetchall()
+
+        if rows:
+            records = [self.serializer.loads(row[0]) for row in rows]
+        else:
+            records = list(self.read_legacy_files().values())
+            if records:
+                self.run(self.write_rows, [
+                    (record["id"], self.serialize(record))
+                    for record in records])
+                logging.info("Imported {} {} files into {}".format(
+                    len(records), self.collection.__class__.__name__,
+                    settings.SQLITE_DATABASE))
+
+        self.store_loaded(records, started)
+
+    def serialize(self, record):
+        contents = self.serializer.dumps(self.collection.dehydrate(record))
+        if self.serializer.BINARY:
+            contents = contents.decode("utf-8")
+        return contents
+
+    def post_save(self, record):
+        self.pending[record["id"]] = record
+        self.schedule_write()
+
+    def post_delete(self, record):
+        self.pending[record["id"]] = None
+        self.schedule_write()
+
+    def schedule_write(self):
+        if self.flush_timer is None:
+            self.flush_timer = gevent.spawn_later(
+                settings.STORAGE_FLUSH_DELAY, self.write_pending)
+
+    def flush(self, record=None):
+        """Commit every pending change and wait until it is stored."""
+        self.write_pending()
+
+        # Wait for any commit still running for another greenlet.
+        with self.LOCK:
+            pass
+
+    def write_pending(self):
+        self.flush_timer = None
+        if not self.pending:
+            return
+
+        pending, self.pending = self.pending, {}
+
+        # Records are changed by other greenlets, serialize them on the loop.
+        rows = []
+        for record_id, record in pending.items():
+            if record is None:
+                rows.append((record_id, None))
+            else:
+                rows.append((record_id, self.serialize(record)))
+
+        try:
+            self.run(self.write_rows, rows)
+        except Exception as e:
+            self.collection.game.handle_exception(e)
+            logging.error("Unable to write {} rows to {}".format(
+                len(rows), self.table))
+
+    def run(self, func, *args):
+        """Run a database operation in the storage pool and wait for it."""
+        with self.LOCK:
+            return FileStorage.get_threadpool().apply(func, args)
+
+    def write_rows(self, rows):
+        """Save or delete (id, data) rows in a single transaction."""
+        saves = [row for row in rows if row[1] is not None]
+        deletes = [(row[0],) for row in rows if row[1] is None]
+
+        connection = self.get_connection()
+        with connection:
+            connection.execute("BEGIN")
+            connection.executemany(
+                'INSERT OR REPLACE INTO "{}" (id, data) VALUES (?, ?)'.format(
+                    self.table), saves)
+            connection.executemany(
+                'DELETE FROM "{}" WHERE id = ?'.format(self.table), deletes)
+
+
+def get_default_copier(value):
+    """Return how to copy a default value for a new record, None if shared."""
+    if not isinstance(value, (list, dict)):
+        return None
+
+    items = value.values() if isinstance(value, dict) else value
+    if any(isinstance(item, (list, dict, set)) for item in items):
+        return deepcopy
+
+    # Most defaults are flat, such as [] or {}, a shallow copy will do.
+    return type(value).copy
+
+
+def find_properties(cls):
+    """Map the names of every property on a class, honoring overrides."""
+    properties = {}
+    for klass in reversed(cls.__mro__):
+        for name, value in vars(klass).items():
+            if isinstance(value, property):
+                properties[name] = value
+            elif name in properties:
+                del properties[name]
+    return properties
 
 
 class Entity(object):
@@ -89,6 +807,10 @@ class Entity(object):
         "flags": [],
     }
 
+    def __init_subclass__(cls, **kwargs):
+        super(Entity, cls).__init_subclass__(**kwargs)
+        cls._PROPERTIES = find_properties(cls)
+
     @property
     def children(self):
         return []
@@ -211,11 +933,10 @@ class Entity(object):
         return not self.__eq__(other)
 
     def __init__(self, data=None, collection=None):
-        merged_data = dict(self.DEFAULT_DATA)
-        if data:
-            merged_data.update(data)
-        data = merged_data
+        if data is None:
+            data = {}
 
+        # The wrapper aliases the record, DEFAULT_DATA is consulted on read.
         super(Entity, self).__setattr__("_data", data)
         super(Entity, self).__setattr__("_collection", collection)
 
@@ -228,15 +949,16 @@ class Entity(object):
         return self._collection
 
     def _get_property(self, name):
-        prop_check = getattr(self.__class__, name, None)
-        if isinstance(prop_check, property):
-            return prop_check
-        return None
+        return self._PROPERTIES.get(name, None)
 
     def __setattr__(self, name, value):
         return self.set(name, value)
 
     def __getattr__(self, name):
+        # Plain fields skip straight to the record, see get() for the rest.
+        data = self._data
+        if name in data and name not in self._PROPERTIES:
+            return data[name]
         return self.get(name)
 
     def __setitem__(self, name, value):
@@ -246,19 +968,38 @@ class Entity(object):
         return self.get(name)
 
     def get(self, name, default=None):
-        prop = self._get_property(name)
+        prop = self._PROPERTIES.get(name, None)
         if prop:
             return prop.fget(self, default)
-        else:
-            return self._data.get(name, default)
+
+        data = self._data
+        if name in data:
+            return data[name]
+
+        if name not in self.DEFAULT_DATA:
+            return default
+
+        value = self.DEFAULT_DATA[name]
+        if isinstance(value, (list, dict)):
+            # Mutable defaults are copied so that in-place changes are not
+            # shared between records.  Reading never changes the record, it
+            # may be shared data such as settings.DIRECTIONS, so set the
+            # field to keep a change.
+            value = deepcopy(value)
+
+        return value
 
     def set(self, name, value):
-        prop = self._get_property(name)
+        prop = self._PROPERTIES.get(name, None)
         if prop:
             prop.fset(self, value)
         else:
             self._data[name] = value
 
+            collection = self._collection
+            if collection and name in collection.indexes:
+                collection.reindex_record(self._data)
+
     def set_data(self, data):
         super(Entity, self).__setattr__("_data", data)
 
@@ -283,6 +1024,9 @@ class Entity(object):
         self.set_data(data)
 
 
+Entity._PROPERTIES = find_properties(Entity)
+
+
 class Collection(Injector):
     PERSISTENT = False
     ENTITY_CLASS = Entity
@@ -291,11 +1035,20 @@ class Collection(Injector):
     STORAGE_FILENAME_FIELD = "vnum"
     STORAGE_FILENAME_SUFFIX = None
     DATA_NAME = None
+    INDEXES = ()
 
     def __init__(self, game):
         super(Collection, self).__init__(game)
         name = self.DATA_NAME or self.__class__.__name__
         self.game.data[name] = {}
+
+        self.indexes = {}
+        self.indexed_values = {}
+        self.full_scans = Counter()
+        self.wrappers = weakref.WeakValueDictionary()
+        for field in self.INDEXES:
+            self.indexes[field] = CollectionIndex(field)
+
         self.storage = self.STORAGE_CLASS(self)
 
     def fuzzy_get(self, identifier):
@@ -315,19 +1068,129 @@ class Collection(Injector):
     def data(self, data):
         name = self.DATA_NAME or self.__class__.__name__
         self.game.data[name] = data
+        self.rebuild_indexes()
 
-    def query(self, spec=None, as_dict=False):
-        def _filter_function(record):
-            if spec is None:
-                return True
+    def rebuild_indexes(self):
+        """Recalculate every index from the current records."""
+        self.indexed_values = {}
+        for index in self.indexes.values():
+            index.clear()
+
+        for record in self.data.values():
+            self.index_record(record)
+
+    def index_record(self, record):
+        """Bring the indexes up to date with a stored record."""
+        record_id = record["id"]
+        previous = self.indexed_values.get(record_id, {})
+        values = {}
+
+        for field, index in self.indexes.items():
+            value = record.get(field, None)
+
+            if field in previous:
+                if field in record and previous[field] == value:
+                    values[field] = value
+                    continue
+                index.remove(record_id, previous[field])
+
+            if field not in record:
+                continue
+
+            try:
+                index.add(record_id, value)
+            except TypeError:
+                # Unhashable values can only be found by scanning.
+                continue
+
+            values[field] = value
+
+        self.indexed_values[record_id] = values
+
+    def reindex_record(self, record):
+        """Update the indexes for a record changed in place, if stored."""
+        record_id = record.get("id", None)
+        if record_id is not None and self.data.get(record_id, None) is record:
+            self.index_record(record)
+
+    def unindex_record(self, record):
+        """Remove a record from the indexes."""
+        previous = self.indexed_values.pop(record["id"], {})
+        for field, value in previous.items():
+            self.indexes[field].remove(record["id"], value)
+
+    def plan_query(self, spec):
+        """Choose the smallest index bucket that can answer a spec.
+
+        Returns the name of the index used (or None for a full scan), the
+        candidate record ids and the keys which still need to be compared.
+        """
+        best_field = None
+        best_ids = None
+
+        for key in spec:
+            index = self.indexes.get(key, None)
+            if index is None:
+                continue
+
+            try:
+                ids = index.lookup(spec[key])
+            except TypeError:
+                continue
+
+            if best_ids is None or len(ids) < len(best_ids):
+                best_field = key
+                best_ids = ids
+
+                if not ids:
+                    break
+
+        if best_ids is None:
+            return None, self.data, list(spec)
+
+        remaining = [key for key in spec if key != best_field]
+        return best_field, best_ids, remaining
+
+    def explain(self, spec=None):
+        """Describe how a query for spec would be executed."""
+        if spec is None:
+            spec = {}
+
+        field, ids, remaining = self.plan_query(spec)
+        return {
+            "collection": self.__class__.__name__,
+            "spec": sorted(spec),
+            "index": field,
+            "full_scan": field is None,
+            "candidates": len(ids),
+            "records": len(self.data),
+            "filter": remaining,
+            "full_scans": self.full_scans[tuple(sorted(spec))],
+        }
+
+    def find_records(self, spec=None):
+        """Return the list of raw records matching a spec."""
+        if spec is None:
+            return list(self.data.values())
+
+        field, ids, remaining = self.plan_query(spec)
+        if field is None and spec:
+            self.full_scans[tuple(sorted(spec))] += 1
+
+        data = self.data
+        records = []
+        for record_id in ids:
+            record = data[record_id]
+            for key in remaining:
+                if key not in record or spec[key] != record[key]:
+                    break
             else:
-                for key in spec:
-                    if key not in record or spec[key] != record[key]:
-                        return False
-                return True
+                records.append(record)
 
-        filtered = filter(_filter_function, self.data.values())
-        for record in list(filtered):
+        return records
+
+    def query(self, spec=None, as_dict=False):
+        for record in self.find_records(spec):
             if as_dict:
                 yield record
             else:
@@ -340,6 +1203,8 @@ class Collection(Injector):
         elif isinstance(spec, str):
             record = self.data.get(spec, None)
             if not record:
+                if self.storage.load_missing(spec):
+                    return self.get(spec)
                 return None
             return self.wrap_record(record)
 
@@ -347,37 +1212,112 @@ class Collection(Injector):
             for record in self.query(spec):
                 return record
 
+            if self.storage.load_missing(spec):
+                return self.get(spec)
+
     def save(self, record, skip_storage=False):
         logging.debug("Saving {} record {}".format(
             self.__class__.__name__, record.get("vnum", None)))
 
+        entity = record
         record = self.unwrap_record(record)
 
         default_data = self.ENTITY_CLASS.DEFAULT_DATA
         if default_data:
             for key, value in default_data.items():
                 if key not in record:
-                    record[key] = value
+                    record[key] = deepcopy(value)
 
         if "id" not in record:
             record["id"] = get_random_hash()
         self.data[record["id"]] = record
+        self.index_record(record)
 
         if not skip_storage:
-            storage_record = self.dehydrate(record)
-            self.storage.post_save(storage_record)
+            self.storage.post_save(record)
+
+        # The saved wrapper now aliases the stored record, keep handing it out.
+        if isinstance(entity, Entity) and entity._collection is self:
+            self.wrappers[record["id"]] = entity
 
         return self.get(record["id"])
 
+    def insert(self, records):
+        """
+        Store records which are already persisted, such as those loaded at
+        startup, without the logging and storage work of a save.
+        """
+        default_data = [
+            (key, value, get_default_copier(value))
+            for key, value in self.ENTITY_CLASS.DEFAULT_DATA.items()]
+        fields = list(self.indexes)
+        added = {field: [] for field in fields}
+        indexed_values = self.indexed_values
+        data = self.data
+
+        for record in records:
+            for key, value, copier in default_data:
+                if key not in record:
+                    record[key] = value if copier is None else copier(value)
+
+            record_id = record.get("id", None)
+            if record_id is None:
+                record_id = record["id"] = get_random_hash()
+            data[record_id] = record
+
+            if record_id in indexed_values:
+                # Stored already, maybe earlier on, so index it in order.
+                self.add_to_indexes(added)
+                self.index_record(record)
+                continue
+
+            # New records, as most are, are added to each index at once.
+            values = {}
+            for field in fields:
+                if field in record:
+                    value = values[field] = record[field]
+                    added[field].append((record_id, value))
+            indexed_values[record_id] = values
+
+        self.add_to_indexes(added)
+
+    def add_to_indexes(self, added):
+        """Add lists of (record_id, value) pairs to the indexes by field."""
+        for field, pairs in added.items():
+            for record_id in self.indexes[field].add_many(pairs):
+                # Unhashable values can only be found by scanning.
+                del self.indexed_values[record_id][field]
+            del pairs[:]
+
+    def evict(self, records):
+        """Drop records from memory only, leaving their storage alone."""
+        data = self.data
+        for record in records:
+            data.pop(record["id"], None)
+            self.unindex_record(record)
+            self.wrappers.pop(record["id"], None)
+
     def unwrap_record(self, record):
         if isinstance(record, Entity):
             return record.get_data()
         return record
 
     def wrap_record(self, record):
-        if isinstance(record, dict):
+        """Return the Entity for a record, reusing a live wrapper if any."""
+        if not isinstance(record, dict):
+            return record
+
+        record_id = record.get("id", None)
+        if record_id is None:
             return self.ENTITY_CLASS(data=record, collection=self)
-        return record
+
+        entity = self.wrappers.get(record_id, None)
+        if entity is not None and entity._data is record:
+            return entity
+
+        entity = self.ENTITY_CLASS(data=record, collection=self)
+        self.wrappers[record_id] = entity
+        return entity
 
     def delete(self, record):
         record = self.unwrap_record(record)
@@ -390,6 +1330,8 @@ class Collection(Injector):
             child.delete()
 
         del self.data[record["id"]]
+        self.unindex_record(record)
+        self.wrappers.pop(record["id"], None)
 
         self.storage.post_delete(record)
         self.post_delete(record)
@@ -398,8 +1340,17 @@ class Collection(Injector):
         """Handle a record being removed from the Collection."""
         pass
 
+    def flush(self, record=None):
+        """Persist pending saves now, for one record or the whole storage."""
+        if record is not None:
+            record = self.unwrap_record(record)
+        self.storage.flush(record)
+
+    def snapshot(self, snapshot):
+        self.storage.snapshot(snapshot)
+
     def dehydrate(self, record):
-        """Prepare data for cold storage."""
+        """Prepare data for cold storage, called when it is written."""
         return record
 
     def hydrate(self, record):
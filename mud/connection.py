@@ -21,6 +21,11 @@ class Connection(object):
     def game(self):
         return self.server.game
 
+    @property
+    def terminal_size(self):
+        """The client's window width and height, None where unknown."""
+        return None, None
+
     def start(self):
         """Execute commands for starting of Connection."""
         self.client.start()
@@ -1,7 +1,10 @@
 from datetime import datetime
 from logging.handlers import RotatingFileHandler
+from mud.broadcast import Broadcast
 from mud.inject import inject
+from mud.snapshot import Snapshot
 
+import gc
 import gevent
 import importlib
 import logging
@@ -30,13 +33,26 @@ class Game(object):
     def __init__(self):
         self.data = {}
         self.injectors = {}
+        self.injectors_version = 0
         self.modules = []
         self.managers = []
         self.connections = {}
         self.commands = {}
         self.start_date = datetime.now()
 
-        self.import_modules_from_settings()
+        # Loading builds a great many objects that all live on, so the
+        # collector would only walk them again and again until it is done.
+        gc.disable()
+        try:
+            # Stored records from the last run, used while loading Injectors.
+            self.snapshot = Snapshot.load(settings.SNAPSHOT_FILE)
+            self.import_modules_from_settings()
+            self.snapshot.clear()
+        finally:
+            gc.enable()
+
+        # Keep the loaded world out of the collections the game will run.
+        gc.freeze()
 
     @property
     def game(self):
@@ -55,12 +71,17 @@ class Game(object):
     def trigger(self, *args, **kwargs):
         logging.debug("Global triggered {} {}".format(args, kwargs))
 
-    def echo(self, message, exclude=None):
+    def echo(self, message, exclude=None, low_priority=False):
         """Send a message to all players."""
         if not exclude:
             exclude = []
 
-        for conn in self.connections.values():
+        # Colorize the message once per variant, not once per player.
+        if not isinstance(message, Broadcast):
+            message = Broadcast(message, low_priority=low_priority)
+
+        # Copied, as a client falling too far behind is disconnected.
+        for conn in list(self.connections.values()):
             actor = conn.client.actor
             if not actor:
                 continue
@@ -103,6 +124,7 @@ class Game(object):
     def register_injector(self, injector):
         instance = injector(self)
         self.injectors[injector.__name__] = instance
+        self.injectors_version += 1
         logging.info("Registered injector {}".format(
             instance.__class__.__name__))
         return instance
@@ -132,8 +154,38 @@ class Game(object):
 
         self.broadcast("after:spawn")
 
+        if settings.SNAPSHOT_FILE and settings.SNAPSHOT_INTERVAL:
+            gevent.spawn(self.snapshot_loop)
+
         while self.running:
             gevent.sleep(1.0)
 
+    def flush(self):
+        """Write out every Injector's pending state."""
+        for injector in self.injectors.values():
+            injector.flush()
+
+    def write_snapshot(self):
+        """Write the stored data to a Snapshot to load on the next start."""
+        snapshot = Snapshot()
+        for injector in self.injectors.values():
+            injector.snapshot(snapshot)
+
+        # Records are collected on the loop, pickling them need not block it.
+        gevent.get_hub().threadpool.apply(
+            snapshot.write, (settings.SNAPSHOT_FILE,))
+
+    def snapshot_loop(self):
+        while self.running:
+            gevent.sleep(settings.SNAPSHOT_INTERVAL)
+            try:
+                self.write_snapshot()
+            except Exception as e:
+                self.handle_exception(e)
+
     def stop(self):
         self.running = False
+        self.flush()
+
+        if settings.SNAPSHOT_FILE:
+            self.write_snapshot()
@@ -0,0 +1,44 @@
+class CollectionIndex(object):
+    """Hash index of record ids, bucketed by the value of a single field."""
+
+    def __init__(self, field):
+        self.field = field
+        self.buckets = {}
+
+    def add(self, record_id, value):
+        bucket = self.buckets.get(value, None)
+        if bucket is None:
+            bucket = self.buckets[value] = {}
+        bucket[record_id] = True
+
+    def add_many(self, pairs):
+        """Add (record_id, value) pairs, returning the ids left unhashable."""
+        buckets = self.buckets
+        unhashable = []
+        for record_id, value in pairs:
+            try:
+                bucket = buckets.get(value, None)
+            except TypeError:
+                unhashable.append(record_id)
+                continue
+
+            if bucket is None:
+                bucket = buckets[value] = {}
+            bucket[record_id] = True
+        return unhashable
+
+    def remove(self, record_id, value):
+        bucket = self.buckets.get(value, None)
+        if bucket is None:
+            return
+
+        bucket.pop(record_id, None)
+        if not bucket:
+            del self.buckets[value]
+
+    def lookup(self, value):
+        """Return the ids of records whose field equals value."""
+        return self.buckets.get(value, {})
+
+    def clear(self):
+        self.buckets = {}
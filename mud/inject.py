@@ -1,8 +1,31 @@
+from functools import wraps
+
+
 def inject(*injector_names):
     def decorator(func):
+        # Injectors resolved for the last Game seen, invalidated whenever
+        # that Game registers another injector.
+        resolved = {"game": None, "version": None, "injectors": {}}
+
+        def resolve(game):
+            resolved["injectors"] = {
+                name: game.get_injector(name) for name in injector_names}
+            resolved["game"] = game
+            resolved["version"] = game.injectors_version
+            return resolved["injectors"]
+
+        @wraps(func)
         def wrapper(self, *args, **kwargs):
-            for name in injector_names:
-                kwargs[name] = self.game.get_injector(name)
-            return func(self, *args, **kwargs)
+            game = self.game
+            if resolved["game"] is game and \
+                    resolved["version"] == game.injectors_version:
+                injectors = resolved["injectors"]
+            else:
+                injectors = resolve(game)
+
+            if kwargs:
+                kwargs.update(injectors)
+                return func(self, *args, **kwargs)
+            return func(self, *args, **injectors)
         return wrapper
     return decorator
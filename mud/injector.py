@@ -3,4 +3,11 @@ from mud.game_component import GameComponent
 
 class Injector(GameComponent):
     DESCRIPTION = ""
-    pass
+
+    def flush(self):
+        """Persist any state that has not been written out yet."""
+        pass
+
+    def snapshot(self, snapshot):
+        """Add any persisted state to a Snapshot for faster restarts."""
+        pass
@@ -0,0 +1,88 @@
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class UnavailableSerializer(Exception):
+    pass
+
+
+class Serializer(object):
+    """Turn records into file contents and back, for a STORAGE_FORMAT."""
+    SUFFIX = None
+    BINARY = False
+
+
+class JSONSerializer(Serializer):
+    """Compact JSON, for files only the game reads and writes."""
+    SUFFIX = "json"
+
+    def dumps(self, record):
+        return json.dumps(record, separators=(",", ":"))
+
+    def loads(self, contents):
+        return json.loads(contents)
+
+
+class PrettyJSONSerializer(JSONSerializer):
+    """Indented JSON with sorted keys, for files people read and diff."""
+
+    def dumps(self, record):
+        return json.dumps(record, indent=4, sort_keys=True)
+
+
+class OrjsonSerializer(Serializer):
+    """Compact JSON encoded by orjson, written as UTF-8 bytes."""
+    SUFFIX = "json"
+    BINARY = True
+    MODULE = orjson
+
+    def dumps(self, record):
+        return orjson.dumps(record, option=orjson.OPT_NON_STR_KEYS)
+
+    def loads(self, contents):
+        return orjson.loads(contents)
+
+
+class MsgpackSerializer(Serializer):
+    """MessagePack, the smallest and fastest, but not human readable."""
+    SUFFIX = "msgpack"
+    BINARY = True
+    MODULE = msgpack
+
+    def dumps(self, record):
+        return msgpack.packb(record, use_bin_type=True)
+
+    def loads(self, contents):
+        return msgpack.unpackb(contents, raw=False)
+
+
+SERIALIZERS = {
+    "json": JSONSerializer,
+    "pretty-json": PrettyJSONSerializer,
+    "orjson": OrjsonSerializer,
+    "msgpack": MsgpackSerializer,
+}
+
+
+def get_serializer(name):
+    """Return the Serializer for a STORAGE_FORMAT name."""
+    if name not in SERIALIZERS:
+        raise UnavailableSerializer(
+            "{} is not a valid storage format".format(name))
+
+    serializer_class = SERIALIZERS[name]
+    if getattr(serializer_class, "MODULE", True) is None:
+        raise UnavailableSerializer(
+            "The {} storage format needs the {} package installed".format(
+                name, name))
+
+    return serializer_class()
@@ -0,0 +1,116 @@
+import logging
+import os
+import pickle
+import struct
+import zlib
+
+
+def get_stamp(stat):
+    """Return what identifies a version of a file, from its os.stat."""
+    return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+
+class Snapshot(object):
+    """
+    Stored records, saved in one binary file for warm restarts.
+
+    Each entry holds what a storage parsed from some of its files, stamped
+    with the inode, size and modification time of each file when it was
+    read, and is only used while exactly those files still have those
+    stamps, so anything changed on disk since is parsed again instead.
+    Entries are read from the files themselves, as records in memory may
+    hold changes that were never saved.
+
+    Storages defer reading their files to the thread pool which writes the
+    snapshot, so that taking one does not stall the game.
+    """
+    MAGIC = b"UMSNAP"
+    VERSION = 3
+    # Magic, format version, payload length and payload CRC-32.
+    HEADER = struct.Struct("!6sHQI")
+
+    def __init__(self, entries=None):
+        self.entries = {} if entries is None else entries
+        self.deferred = []
+
+    @classmethod
+    def load(cls, path):
+        """Return the Snapshot at path, or an empty one if it is unusable."""
+        if not path or not os.path.exists(path):
+            return cls()
+
+        try:
+            with open(path, "rb") as fh:
+                header = fh.read(cls.HEADER.size)
+                payload = fh.read()
+
+            magic, version, length, checksum = cls.HEADER.unpack(header)
+            if magic != cls.MAGIC or version != cls.VERSION:
+                raise ValueError("unknown format")
+            if length != len(payload) or checksum != zlib.crc32(payload):
+                raise ValueError("checksum mismatch")
+
+            entries = pickle.loads(payload)
+        except Exception as e:
+            logging.warning("Ignoring snapshot {}: {}".format(path, e))
+            return cls()
+
+        logging.info("Loaded snapshot of {} entries from {}".format(
+            len(entries), path))
+        return cls(entries)
+
+    def add(self, key, stamps, payload):
+        """Store a payload read from the files stamped in stamps."""
+        self.entries[key] = (stamps, payload)
+
+    def pop(self, key, paths):
+        """
+        Return the payload for key if it was read from exactly these paths
+        and none of them changed since, else None.
+        """
+        entry = self.entries.pop(key, None)
+        if entry is None:
+            return None
+
+        stamps, payload = entry
+        if len(stamps) != len(paths):
+            return None
+
+        for path in paths:
+            try:
+                if get_stamp(os.stat(path)) != stamps.get(path, None):
+                    return None
+            except OSError:
+                return None
+
+        return payload
+
+    def defer(self, func, *args):
+        """Call func(snapshot, *args) in the pool, before it is written."""
+        self.deferred.append((func, args))
+
+    def clear(self):
+        self.entries = {}
+
+    def write(self, path):
+        for func, args in self.deferred:
+            try:
+                func(self, *args)
+            except Exception as e:
+                # Left out, those files are parsed on the next start.
+                logging.error("Unable to add to snapshot {}: {}".format(
+                    path, e))
+        self.deferred = []
+
+        payload = pickle.dumps(self.entries, protocol=5)
+        header = self.HEADER.pack(
+            self.MAGIC, self.VERSION, len(payload), zlib.crc32(payload))
+
+        temp_path = path + ".TMP"
+        with open(temp_path, "wb") as fh:
+            fh.write(header)
+            fh.write(payload)
+
+        os.replace(temp_path, path)
+        logging.info("Wrote snapshot of {} entries to {}".format(
+            len(self.entries), path))
@@ -21,6 +21,64 @@ PASSWORD_ROUNDS = 100000
 
 TICK_SECONDS = 5.0  # Defaults to one tick per minute
 
+# How long can a saved record wait before it is written to disk?  Saves of
+# the same record within this window are coalesced into a single write.
+# Default: 5.0
+STORAGE_FLUSH_DELAY = 5.0
+
+# How many threads write data files, keeping disk access off the game loop?
+# Default: 4
+STORAGE_THREADS = 4
+
+# How many bytes can a JournalStorage segment hold before a new one is begun,
+# and how many full segments are kept before they are compacted?
+# Default: 4194304 and 8
+JOURNAL_SEGMENT_SIZE = 4 * 1024 * 1024
+JOURNAL_COMPACT_SEGMENTS = 8
+
+# Which database file do Collections using SQLiteStorage share?
+# Default: <data_folder>/undermountain.sqlite3
+SQLITE_DATABASE = "{}/undermountain.sqlite3".format(DATA_FOLDER)
+
+# How are Characters stored?  "journal" appends their changes to a log under
+# data/journals, "sqlite" keeps them in SQLITE_DATABASE, and "file" writes
+# one file each to data/characters.  Starting with an empty journal or table
+# imports the files that "file" wrote.
+# Default: "journal"
+CHARACTER_STORAGE = "journal"
+
+# Should an Area's rooms, actors, objects and scripts only be loaded once
+# something looks them up, and be unloaded again after no players have been
+# in the Area for AREA_IDLE_MINUTES?  Keeps large worlds small in memory.
+# Default: False and 15
+AREA_LAZY_LOADING = False
+AREA_IDLE_MINUTES = 15
+
+# How many edits can an Area's journal hold before the Area file is rewritten
+# in full?  Smaller numbers mean faster loading but slower building.
+# Default: 1000
+AREA_JOURNAL_LIMIT = 1000
+
+# Where is the snapshot of the data files and journals written on a clean
+# shutdown?  It is loaded on start in place of any of them unchanged since
+# it was written.  None to disable snapshots.
+# Default: <base_folder>/snapshot.bin
+SNAPSHOT_FILE = "{}/snapshot.bin".format(BASE_FOLDER)
+
+# How many seconds between snapshots while the game runs?  None to only
+# write one on shutdown.
+# Default: None
+SNAPSHOT_INTERVAL = None
+
+# How many rendered maps, by room and size, are kept for reuse until the
+# exits of the world change?
+# Default: 1000
+MAP_CACHE_SIZE = 1000
+
+# How many recent routes between rooms does the Pathfinder keep?
+# Default: 10000
+PATHFINDER_CACHE_SIZE = 10000
+
 # Special keywords.
 SELF_NAMES = (
     "self",
@@ -85,6 +143,27 @@ WEBSOCKET_PORTS = (
     ("0.0.0.0", 14201),
 )
 
+# How many bytes of output can wait for a slow telnet client?  Above the
+# high watermark, low priority output such as channels and other people's
+# fights is dropped until the queue drains below the low watermark.  A client whose
+# queue reaches the limit is disconnected.
+# Default: 65536, 16384 and 1048576
+TELNET_OUTPUT_HIGH_WATER = 64 * 1024
+TELNET_OUTPUT_LOW_WATER = 16 * 1024
+TELNET_OUTPUT_LIMIT = 1024 * 1024
+
+# How many characters can a line of telnet input hold, and how many lines
+# can wait to be run?  Longer lines are cut short and extra lines ignored.
+# Default: 4096 and 100
+TELNET_MAX_LINE_LENGTH = 4096
+TELNET_MAX_PENDING_LINES = 100
+
+# How hard is telnet output compressed for clients that support MCCP2, from
+# 1 (least CPU) to 9 (smallest output)?  Lower it if the server is short on
+# CPU, or None to not offer compression at all.
+# Default: 6
+TELNET_COMPRESSION_LEVEL = 6
+
 INITIAL_ROOM_VNUM = "market_square"
 
 VNUM_AREA_SEPARATOR = ":"
@@ -4,13 +4,14 @@ ANSI MUD Colorization.
 Colorization library for helping with MUD-style color symbols to transform
 them to/from their special escape codes.
 """
-import collections
+import collections.abc
+import functools
 import random
+import re
 
 
 ESCAPE = chr(27)
 CSI = ESCAPE + '['
-REAL_BRACKET_SYMBOL = '((bracket))'
 
 REMAPS = {
     "{r": CSI + "0;31m",  # Red
@@ -57,9 +58,64 @@ REMAPS = {
 }
 
 
+class ColorCodes(dict):
+    """Color code symbols mapped to their output, "{-" to a random color."""
+
+    def __missing__(self, symbol):
+        return random_color()
+
+
+# Every code is "{" and one symbol: the REMAPS colors, "{-" for a random
+# color and "{{" for a literal bracket.  One compiled pattern splits them
+# all out of a message, and each is looked up by its symbol.
+RANDOM_SYMBOL = "-"
+ANSI_CODES = ColorCodes((key[1], value) for key, value in REMAPS.items())
+ANSI_CODES["{"] = "{"
+STRIPPED_CODES = {symbol: "" for symbol in ANSI_CODES}
+STRIPPED_CODES["{"] = "{"
+STRIPPED_CODES[RANDOM_SYMBOL] = ""
+CODE_PATTERN = re.compile(
+    "{([" + re.escape("".join(ANSI_CODES) + RANDOM_SYMBOL) + "])")
+
+# How many distinct messages, such as prompts and room titles, are kept
+# translated for reuse.
+CACHE_SIZE = 4096
+
+
+def random_color():
+    color = 30 + random.randint(0, 7)
+
+    if color == 30:
+        brightness = 1
+    else:
+        brightness = random.randint(0, 1)
+
+    return CSI + str(brightness) + ";" + str(color) + "m"
+
+
+def translate(in_string, codes):
+    """Replace every color code using a map of code symbols to output."""
+    # The symbol of each code lands between the text around it.
+    pieces = CODE_PATTERN.split(in_string)
+    pieces[1::2] = map(codes.__getitem__, pieces[1::2])
+    return "".join(pieces)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def colorize_cached(in_string):
+    return translate(in_string, ANSI_CODES)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def decolorize_cached(in_string):
+    return translate(in_string, STRIPPED_CODES)
+
+
 def decolorize(in_string):
     """Convert a color-coded string to remove all color codes."""
-    return colorize(in_string, strip_colors=True)
+    if "{" not in in_string:
+        return in_string
+    return decolorize_cached(in_string)
 
 
 def escape(message):
@@ -68,59 +124,32 @@ def escape(message):
 
 def colorize(in_string, strip_colors=False):
     """Convert a color-coded string to ANSI-encoded."""
-    out_string = in_string
-
-    # Replace "brackets" with a placeholder
-    out_string = out_string.replace('{{', REAL_BRACKET_SYMBOL)
+    if "{" not in in_string:
+        return in_string
 
-    # Replace out bracket colors with ANSI
-    for key in REMAPS:
-        color = REMAPS[key]
-        ansi = color
+    if strip_colors:
+        return decolorize_cached(in_string)
 
-        if not strip_colors:
-            out_string = out_string.replace(key, ansi)
-        else:
-            out_string = out_string.replace(key, '')
+    # Random colors differ every time, so they cannot be cached.
+    if "{-" in in_string:
+        return translate(in_string, ANSI_CODES)
 
-    # Replace random color codes with random ANSI colors
-    if not strip_colors:
-        random_count = out_string.count("{-")
-        for _ in range(0, random_count):
-            color = 30 + random.randint(0, 7)
-
-            if color == 30:
-                brightness = 1
-            else:
-                brightness = random.randint(0, 1)
-
-            color = str(color)
-            brightness = str(brightness)
-
-            ansi = CSI + brightness + ";" + color + "m"
-
-            # One random at a time
-            out_string = out_string.replace("{-", ansi, 1)
-    else:
-        # Remove all random colors
-        out_string = out_string.replace("{-", '')
+    return colorize_cached(in_string)
 
-    # Replace the previous placeholders with the brackets
-    out_string = out_string.replace(REAL_BRACKET_SYMBOL, "{")
 
-    return out_string
+def visible_length(message):
+    """Return how many characters a color-coded string displays as."""
+    return len(decolorize(message))
 
 
 def pad_left(message, length, symbol=" "):
     """Pad a colorized string's left."""
-    stripped = decolorize(message)
-    return (symbol * max(0, length - len(stripped))) + message
+    return (symbol * max(0, length - visible_length(message))) + message
 
 
 def pad_right(message, length, symbol=" "):
     """Pad a colorized string's right."""
-    stripped = decolorize(message)
-    return message + (symbol * max(0, length - len(stripped)))
+    return message + (symbol * max(0, length - visible_length(message)))
 
 
 def stop_color_bleed(message):
@@ -134,7 +163,7 @@ def stop_color_bleed(message):
     # Convert to a list, to iterate over content.
     is_list = True
     lines = message
-    if not isinstance(lines, collections.Iterable):
+    if not isinstance(lines, collections.abc.Iterable):
         is_list = False
         lines = [lines]
 
@@ -0,0 +1,277 @@
+"""
+The telnet protocol, as spoken by MUD clients.
+
+See RFC 854 (telnet), 885 (EOR), 1073 (NAWS), 1091 (TTYPE) and 2066
+(CHARSET), and the MUD Client Compression Protocol, version 2 (MCCP2).
+"""
+
+# Commands
+SE = 240
+NOP = 241
+GA = 249
+SB = 250
+WILL = 251
+WONT = 252
+DO = 253
+DONT = 254
+IAC = 255
+
+# Options
+TTYPE = 24
+EOR_OPTION = 25
+NAWS = 31
+CHARSET = 42
+COMPRESS2 = 86
+
+# Command sent after a prompt once the EOR option is on
+EOR = 239
+
+# Subnegotiation codes
+TTYPE_IS = 0
+TTYPE_SEND = 1
+CHARSET_REQUEST = 1
+CHARSET_ACCEPTED = 2
+CHARSET_REJECTED = 3
+
+# Parser states
+DATA = 0
+COMMAND = 1
+OPTION = 2
+SUBNEGOTIATION = 3
+SUBNEGOTIATION_IAC = 4
+
+IAC_BYTE = bytes([IAC])
+
+
+class TelnetProtocol(object):
+    """
+    Strip telnet commands out of received bytes and negotiate options.
+
+    Output written by the game is UTF-8, which never contains an IAC byte,
+    so it is sent as-is.
+
+    The options are offered as soon as a client connects, as most MUD
+    clients only negotiate once the server asks, so a raw socket client
+    such as netcat receives those few bytes once.  After that, it is sent
+    no telnet commands unless it sends one first.
+    """
+    # Options the server performs itself, and lets the client perform.
+    LOCAL_OPTIONS = (EOR_OPTION, CHARSET)
+    REMOTE_OPTIONS = (NAWS, TTYPE, CHARSET)
+
+    # Options asked for as soon as a client connects.
+    OFFERS = ((DO, NAWS), (DO, TTYPE), (WILL, EOR_OPTION), (WILL, CHARSET))
+
+    # Longest subnegotiation kept, anything longer is cut short.
+    MAX_SUBNEGOTIATION = 1024
+
+    def __init__(self, send, compress=None):
+        """
+        :param send: function writing bytes to the client
+        :param compress: function turning compression of everything sent
+            after on or off, None if the server does not compress
+        """
+        self.send = send
+        self.compress = compress
+
+        self.local_options = self.LOCAL_OPTIONS
+        self.offers = self.OFFERS
+        if compress:
+            self.local_options += (COMPRESS2,)
+            self.offers += ((WILL, COMPRESS2),)
+
+        self.state = DATA
+        self.verb = None
+        self.subnegotiation = bytearray()
+
+        self.local = set()
+        self.remote = set()
+        self.pending = set()
+
+        # Whether the client has sent any telnet command at all.
+        self.active = False
+
+        self.width = None
+        self.height = None
+        self.terminal_type = None
+        self.charset = None
+
+    def start(self):
+        """Offer the options the server wants, to any kind of client."""
+        for verb, option in self.offers:
+            self.request(verb, option)
+
+    def request(self, verb, option):
+        self.pending.add((verb, option))
+        self.send_command(verb, option)
+
+    def send_command(self, verb, option):
+        self.send(bytes((IAC, verb, option)))
+
+    def send_subnegotiation(self, option, data):
+        self.send(bytes((IAC, SB, option)) + data + bytes((IAC, SE)))
+
+    def get_prompt_end(self):
+        """Return the bytes that tell the client a prompt is complete."""
+        if EOR_OPTION in self.local:
+            return bytes((IAC, EOR))
+
+        # Clients that do not speak telnet would show a GA as garbage.
+        if self.active:
+            return bytes((IAC, GA))
+
+        return b""
+
+    def feed(self, data):
+        """Return the text in data, handling the telnet commands around it."""
+        if self.state == DATA and IAC_BYTE not in data:
+            return data
+
+        output = bytearray()
+        state = self.state
+        index = 0
+        length = len(data)
+
+        while index < length:
+            if state == DATA:
+                found = data.find(IAC_BYTE, index)
+                if found < 0:
+                    output += data[index:]
+                    break
+
+                output += data[index:found]
+                index = found + 1
+                state = COMMAND
+                continue
+
+            byte = data[index]
+            index += 1
+
+            if state == COMMAND:
+                if byte == IAC:
+                    output.append(IAC)
+                    state = DATA
+                elif WILL <= byte <= DONT:
+                    self.verb = byte
+                    state = OPTION
+                elif byte == SB:
+                    self.subnegotiation.clear()
+                    state = SUBNEGOTIATION
+                else:
+                    # NOP, GA, AYT and friends need no answer.
+                    self.active = True
+                    state = DATA
+
+            elif state == OPTION:
+                self.negotiate(self.verb, byte)
+                state = DATA
+
+            elif state == SUBNEGOTIATION:
+                if byte == IAC:
+                    state = SUBNEGOTIATION_IAC
+                elif len(self.subnegotiation) < self.MAX_SUBNEGOTIATION:
+                    self.subnegotiation.append(byte)
+
+            elif state == SUBNEGOTIATION_IAC:
+                if byte == SE:
+                    self.subnegotiate(bytes(self.subnegotiation))
+                    state = DATA
+                else:
+                    if byte == IAC and \
+                            len(self.subnegotiation) < self.MAX_SUBNEGOTIATION:
+                        self.subnegotiation.append(IAC)
+                    state = SUBNEGOTIATION
+
+        self.state = state
+        return output
+
+    def negotiate(self, verb, option):
+        self.active = True
+
+        if verb == WILL:
+            self.negotiate_enable(
+                option, self.remote, self.REMOTE_OPTIONS, DO, DONT)
+        elif verb == WONT:
+            self.negotiate_disable(option, self.remote, DO, DONT)
+        elif verb == DO:
+            self.negotiate_enable(
+                option, self.local, self.local_options, WILL, WONT)
+        elif verb == DONT:
+            self.negotiate_disable(option, self.local, WILL, WONT)
+
+    def negotiate_enable(self, option, enabled, supported, agree, refuse):
+        if option in enabled:
+            return
+
+        if option not in supported:
+            self.send_command(refuse, option)
+            return
+
+        enabled.add(option)
+
+        # Answer the client, unless it is answering the server.
+        if (agree, option) in self.pending:
+            self.pending.discard((agree, option))
+        else:
+            self.send_command(agree, option)
+
+        self.option_enabled(agree, option)
+
+    def negotiate_disable(self, option, enabled, agree, refuse):
+        self.pending.discard((agree, option))
+
+        # Only acknowledge a change, answering anything else would loop.
+        if option in enabled:
+            enabled.discard(option)
+            self.send_command(refuse, option)
+            self.option_disabled(agree, option)
+
+    def option_enabled(self, verb, option):
+        if verb == DO and option == TTYPE:
+            self.send_subnegotiation(TTYPE, bytes((TTYPE_SEND,)))
+        elif verb == WILL and option == CHARSET:
+            self.send_subnegotiation(
+                CHARSET, bytes((CHARSET_REQUEST,)) + b";UTF-8")
+        elif verb == WILL and option == COMPRESS2:
+            # Everything after this subnegotiation is compressed.
+            self.send_subnegotiation(COMPRESS2, b"")
+            self.compress(True)
+
+    def option_disabled(self, verb, option):
+        if verb == WILL and option == COMPRESS2:
+            self.compress(False)
+
+    def subnegotiate(self, data):
+        if not data:
+            return
+
+        option = data[0]
+
+        if option == NAWS and len(data) >= 5:
+            # Zero means the client does not know that dimension.
+            self.width = ((data[1] << 8) | data[2]) or None
+            self.height = ((data[3] << 8) | data[4]) or None
+
+        elif option == TTYPE and data[1:2] == bytes((TTYPE_IS,)):
+            self.terminal_type = data[2:].decode("ascii", "replace")
+
+        elif option == CHARSET and len(data) >= 2:
+            self.subnegotiate_charset(data[1], data[2:])
+
+    def subnegotiate_charset(self, code, data):
+        if code == CHARSET_REQUEST:
+            # The first byte separates the names of the charsets offered.
+            names = data[1:].split(data[:1]) if data else []
+            if b"UTF-8" in [name.upper() for name in names]:
+                self.charset = "UTF-8"
+                self.send_subnegotiation(
+                    CHARSET, bytes((CHARSET_ACCEPTED,)) + b"UTF-8")
+            else:
+                self.send_subnegotiation(
+                    CHARSET, bytes((CHARSET_REJECTED,)))
+
+        elif code == CHARSET_ACCEPTED:
+            self.charset = data.decode("ascii", "replace")
+
+        elif code == CHARSET_REJECTED:
+            self.charset = None